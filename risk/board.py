@@ -51,3 +51,6 @@ class Board(object):
 
     def countries_list(self):
         return list(self.countries)
+
+    def country_for_name(self, name):
+        return self.country_names[name]
@@ -0,0 +1,125 @@
+from collections import namedtuple
+import random
+import time
+
+from .messages import Message
+
+
+"""
+Snapshot of a game from the perspective of one player, handed to bots.
+It only holds plain data, so it can be sent to another process.
+state is the state of the game's machine, see DEPLOY_STATES and
+ATTACK_STATES. countries contains (name, owner, troops) tuples,
+neighbours maps a country's name to the names of its neighbours.
+seed is a seed for random.Random derived from the game's seed, the seat
+and the progress of the game, so bot games can be replayed from the
+recorded seed.
+"""
+GameView = namedtuple('GameView', [
+    'player', 'state', 'available_troops', 'cards', 'countries',
+    'neighbours', 'seed'
+])
+
+"""States of a game in which troops may be deployed or countries attacked."""
+DEPLOY_STATES = frozenset(['start_of_turn', 'got_bonus', 'deploying'])
+ATTACK_STATES = frozenset(['deploying', 'attacking'])
+
+
+def view_for(logic, ident):
+    """Create the GameView of a game for the player with the given ident."""
+    board = logic.board
+    player = next(p for p in logic.players if p.ident == ident)
+
+    countries = tuple(
+        (c.name, c.owner.ident if c.owner else None, c.troops)
+        for c in board.countries_list()
+    )
+    neighbours = {
+        c.name: tuple(n.name for n in board.edges[c])
+        for c in board.countries_list()
+    }
+
+    # differs for every action of the player, but not between replays
+    seed = '%d:%d:%d:%d' % (logic.rng.seed, player.seat, logic.turns,
+                            sum(player.actions.values()))
+
+    return GameView(ident, logic.state, player.available_troops,
+                    tuple(player.cards), countries, neighbours, seed)
+
+
+def deploy(country, troops):
+    return {'type': Message.Type.Deploy.value,
+            'data': {'country': country, 'troops': troops}}
+
+
+def attack(origin, destination, attack_troops):
+    return {'type': Message.Type.Attack.value,
+            'data': {'origin': origin, 'destination': destination,
+                     'attack_troops': attack_troops}}
+
+
+def finish():
+    return {'type': Message.Type.Finished.value, 'data': {}}
+
+
+class Bot(object):
+    """
+    Base class for built-in players.
+
+    The Controller asks a bot for one action at a time while it is the
+    bot's turn. next_action is executed in a worker pool, so it may
+    compute for a while but must not touch the game directly.
+    Actions are message payloads as sent by network clients.
+    If next_action fails or is too slow, fallback_action is used instead.
+
+    The deadline, a time.monotonic() value, is advisory: the Controller
+    cannot interrupt a running computation, so next_action must check
+    the deadline itself and return in time. A bot that overruns makes
+    the Controller replace its worker pool.
+    """
+
+    def next_action(self, view, deadline):
+        """Override this method to choose the next action."""
+        return self.fallback_action(view)
+
+    def fallback_action(self, view):
+        """Cheap action that is allowed: deploy if possible, else finish."""
+        if view.available_troops > 0 and view.state in DEPLOY_STATES:
+            for (name, owner, _) in view.countries:
+                if owner == view.player:
+                    return deploy(name, view.available_troops)
+
+        return finish()
+
+
+class RandomBot(Bot):
+    """Deploys on a random country, attacks when it has the upper hand."""
+
+    def next_action(self, view, deadline):
+        rng = random.Random(view.seed)
+        owned = [c for c in view.countries if c[1] == view.player]
+
+        if (view.available_troops > 0 and view.state in DEPLOY_STATES
+                and owned):
+            name, _, _ = rng.choice(owned)
+            return deploy(name, view.available_troops)
+
+        if view.state not in ATTACK_STATES:
+            return finish()
+
+        troops = {name: troops for (name, _, troops) in view.countries}
+        owned_names = {name for (name, _, _) in owned}
+        # iterate in board order, sets are ordered differently every run
+        attacks = [
+            (origin, destination)
+            for (origin, _, _) in owned
+            for destination in view.neighbours[origin]
+            if destination not in owned_names
+            and troops[origin] > troops[destination] + 1
+        ]
+
+        if attacks and time.monotonic() < deadline:
+            origin, destination = rng.choice(attacks)
+            return attack(origin, destination, min(3, troops[origin] - 1))
+
+        return finish()
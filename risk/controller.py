@@ -1,10 +1,17 @@
 import asyncio as aio
-import random
+from concurrent.futures import ProcessPoolExecutor
+import time
+import uuid
 
+from . import bots
 from .board import Board
-from .messages import Message, MessageParser, ParseError
+from .messages import InvalidMessage, Message, MessageParser, ParseError
 from .logic import Logic
+from .matchmaking import Matchmaker
+from .ratelimit import Limit, Policy, RateLimiter
+from .results import GameResult, ResultStore
 from .server import Server
+from .stats import TurnStats
 from statemachine import MachineError
 
 
@@ -12,93 +19,369 @@ class Controller(Server.Callbacks):
     """The Controller glues together all functionality."""
 
     PLAYERS_PER_GAME = 4
+    RESULTS_PATH = 'results.sqlite'
+    """Where per-turn statistics are written, None disables them."""
+    STATS_PATH = None
+    """Requests a client may send without waiting for the answers."""
+    MAX_OUTSTANDING = 32
+    """Seconds between two attempts to match waiting players."""
+    MATCH_INTERVAL = 1.0
+    """Seconds a player waits before the game is filled up with bots."""
+    BOT_FILL_WAIT = 30.0
+    """Seconds a bot may compute a single action."""
+    BOT_MOVE_TIME = 1.0
+    BOT_WORKERS = 2
+    BOT_CLASS = bots.RandomBot
 
-    def __init__(self):
-        self.board = Board()
-        self.logic = Logic(self.board, ['a', 'b', 'c', 'd'])
+    """Token bucket limits per message type, see risk.ratelimit."""
+    RATE_LIMITS = {
+        Message.Type.Echo: Limit(rate=5, burst=10, policy=Policy.DELAY),
+        Message.Type.Deploy: Limit(rate=20, burst=40, policy=Policy.DELAY),
+        Message.Type.Attack: Limit(rate=20, burst=40, policy=Policy.DELAY),
+        Message.Type.Move: Limit(rate=20, burst=40, policy=Policy.DELAY),
+        Message.Type.Card: Limit(rate=5, burst=10, policy=Policy.DELAY),
+        Message.Type.Bonus: Limit(rate=5, burst=10, policy=Policy.DELAY),
+        Message.Type.Finished: Limit(rate=5, burst=10, policy=Policy.DELAY),
+    }
+    """Limit for messages without a valid type, they get kicked anyway."""
+    DEFAULT_RATE_LIMIT = Limit(rate=1, burst=5, policy=Policy.KICK)
+
+    def __init__(self, results_path=RESULTS_PATH, bot_executor=None,
+                 stats_path=STATS_PATH):
+        # game of every player that is currently playing
+        self.games = {}
+        # built-in players by ident
+        self.bots = {}
+        # games in which a bot is computing its next action
+        self.thinking = set()
+        # bots run in a separate process by default, such that they
+        # neither block the event loop nor compete for the GIL
+        self.bot_executor = bot_executor
+        # only a pool created here is replaced when a bot overruns
+        self.owns_bot_executor = bot_executor is None
 
         self.message_parser = MessageParser()
-        self.available_players = set()
+        # all players have the same rating for now, see rating()
+        self.matchmaker = Matchmaker(Controller.PLAYERS_PER_GAME)
+        self.results = ResultStore(results_path)
+        self.stats = None
+        if stats_path is not None:
+            self.stats = TurnStats(stats_path)
 
         self.loop = aio.get_event_loop()
-        self.server = Server(self, self.loop)
+        self.rate_limiter = RateLimiter(Controller.RATE_LIMITS,
+                                        Controller.DEFAULT_RATE_LIMIT)
+        self.server = Server(self, self.loop, self.rate_limiter,
+                             Controller.MAX_OUTSTANDING)
 
     def main(self):
         self.server.run('localhost', 8000)
+        self.loop.call_later(Controller.MATCH_INTERVAL, self.match_waiting)
 
         try:
             self.loop.run_forever()
         finally:
             self.loop.close()
+            self.results.close()
+            if self.stats is not None:
+                self.stats.close()
+            if self.bot_executor is not None:
+                self.bot_executor.shutdown(wait=False)
+
+    def rating(self, player):
+        """
+        Return the rating a player is matched by.
+
+        Players are identified by their connection only, so there is
+        nothing to rate them by and everybody gets the default rating.
+        The matchmaker then forms games in order of arrival. Override this
+        method to match by rating once players have lasting identities.
+        """
+        return Matchmaker.DEFAULT_RATING
+
+    def enqueue(self, player):
+        self.matchmaker.enqueue(player, self.rating(player))
+
+        players = self.matchmaker.match(player)
+        if players is not None:
+            self.start_game(players)
+
+    def match_waiting(self):
+        """
+        Periodically match players whose allowed rating gap widened and
+        fill up games for players that waited too long with bots.
+        """
+        for players in self.matchmaker.match_waiting():
+            self.start_game(players)
+
+        while True:
+            players = self.matchmaker.take_overdue(Controller.BOT_FILL_WAIT)
+            if not players:
+                break
 
-    def start_game(self):
-        self.board = Board()
+            missing = Controller.PLAYERS_PER_GAME - len(players)
+            self.start_game(players + [self.add_bot() for _ in range(missing)])
 
-        players = list(self.available_players)
-        random.shuffle(players)
-        chosen_players = players[:Controller.PLAYERS_PER_GAME]
+        self.loop.call_later(Controller.MATCH_INTERVAL, self.match_waiting)
 
-        self.logic = Logic(self.board, chosen_players)
+    def add_bot(self):
+        ident = 'bot-%s' % uuid.uuid4()
+        self.bots[ident] = Controller.BOT_CLASS()
+        return ident
+
+    def start_game(self, players):
+        logic = Logic(Board(), players, stats=self.stats)
+        for player in players:
+            self.games[player] = logic
+
+        logic.start()
+        self.schedule_bot(logic)
 
         # TODO: notify players about game
 
+    def finish_game(self, logic):
+        logic.record_turn()
+        self.results.record_game(GameResult.from_logic(logic,
+                                                       bots=self.bots))
+
+        for player in logic.players:
+            # kicked players already left the game
+            if self.games.get(player.ident) is logic:
+                del self.games[player.ident]
+
+                if self.bots.pop(player.ident, None) is None:
+                    self.enqueue(player.ident)
+
+        # TODO: notify players about result
+
+    def kick(self, player, reason):
+        logic = self.games.pop(player, None)
+        if logic is not None:
+            self.results.record_kick(logic.game_id, player, reason)
+            logic.kick(player)
+
+    def client_group(self, player):
+        logic = self.games.get(player)
+        if logic is None:
+            return None
+
+        return logic.game_id
+
     async def player_connected(self, player):
         print("New player: ", player)
-        self.available_players.add(player)
+        self.enqueue(player)
 
-        if len(self.available_players) == Controller.PLAYERS_PER_GAME:
-            self.start_game()
+    async def player_disconnected(self, player, reason='disconnected'):
+        print("Lost player: ", player, reason)
+        self.matchmaker.remove(player)
 
-    async def player_disconnected(self, player):
-        print("Lost player: ", player)
-        self.available_players.remove(player)
+        logic = self.games.get(player)
+        self.kick(player, reason)
 
-        if self.logic and self.logic.is_ingame(player):
-            self.logic.kick(player)
+        if logic is not None:
+            # a bot takes over the empty seat
+            bot = self.add_bot()
+            logic.replace_player(player, bot)
+            self.games[bot] = logic
+            self.schedule_bot(logic)
 
-    async def message(self, player, payload):
+    def schedule_bot(self, logic):
+        """Let a bot compute its next action if it is its turn."""
+        ident = logic.current_player.ident
+        if ident in self.bots and logic not in self.thinking:
+            self.thinking.add(logic)
+            task = self.loop.create_task(self.play_bot(logic, ident))
+
+            def cancelled(task):
+                # play_bot does not run at all if it is cancelled before
+                # it started, so its finally clause does not either
+                if task.cancelled():
+                    self.thinking.discard(logic)
+
+            task.add_done_callback(cancelled)
+
+    async def play_bot(self, logic, ident):
+        bot = self.bots[ident]
+        view = bots.view_for(logic, ident)
+
+        try:
+            payload = await self.next_bot_action(ident, bot, view)
+        finally:
+            # the game must not be skipped by schedule_bot for good
+            self.thinking.discard(logic)
+
+        if self.games.get(ident) is not logic or not logic.is_current(ident):
+            # game finished or seat taken over in the meantime
+            return
+
+        try:
+            message = self.message_parser.parse_json(payload)
+        except ParseError:
+            print('bot sent invalid action: ', ident, payload)
+            message = self.message_parser.parse_json(
+                bot.fallback_action(view)
+            )
+
+        if self.dispatch_message(ident, message):
+            return
+
+        # ending the turn is the last resort, the seat must not stay idle
+        for fallback in [bot.fallback_action(view), bots.finish()]:
+            if self.dispatch_message(
+                    ident, self.message_parser.parse_json(fallback)):
+                return
+
+        print('bot is stuck: ', ident)
+
+    async def next_bot_action(self, ident, bot, view):
+        """
+        Compute the next action of a bot in the worker pool. Falls back to
+        bot.fallback_action if the bot fails, is too slow or its
+        computation is cancelled.
+        """
+        deadline = time.monotonic() + Controller.BOT_MOVE_TIME
+
+        if self.bot_executor is None:
+            self.bot_executor = self.new_bot_executor()
+
+        try:
+            future = self.loop.run_in_executor(
+                self.bot_executor, bot.next_action, view, deadline
+            )
+        except RuntimeError as exc:
+            # the pool was shut down
+            print('bot failed: ', ident, repr(exc))
+            return bot.fallback_action(view)
+
+        # unlike wait_for, wait does not raise if the future is cancelled
+        done, _ = await aio.wait([future], timeout=Controller.BOT_MOVE_TIME)
+
+        if not done:
+            print('bot too slow: ', ident)
+            future.cancel()
+            self.replace_bot_executor()
+        elif future.cancelled():
+            print('bot move cancelled: ', ident)
+        elif future.exception() is not None:
+            print('bot failed: ', ident, repr(future.exception()))
+        else:
+            return future.result()
+
+        return bot.fallback_action(view)
+
+    def new_bot_executor(self):
+        """Create the pool bots compute their actions in."""
+        return ProcessPoolExecutor(Controller.BOT_WORKERS)
+
+    def replace_bot_executor(self):
+        """
+        Start a new pool for the bots of all other games. Waiting for a
+        bot does not stop its computation, so a bot that overruns its
+        deadline would keep a worker busy. Moves already queued in the old
+        pool are still computed, its workers exit once they are done.
+        """
+        if self.owns_bot_executor and self.bot_executor is not None:
+            self.bot_executor.shutdown(wait=False)
+            self.bot_executor = None
+
+    def decode(self, player, line):
         try:
-            message = self.message_parser.parse(payload)
-            self.dispatch_message(player, message)
+            return self.message_parser.parse(line)
         except ParseError:
-            print('parsing failed: ', payload)
-            if self.logic and self.logic.is_ingame(player):
-                self.logic.kick(player)
+            print('parsing failed: ', line)
+            ident = self.message_parser.peek_id(line)
+            return InvalidMessage(ident, 'Invalid message.')
+
+    def classify(self, player, payload):
+        return payload.type
+
+    async def message(self, player, payload):
+        if isinstance(payload, InvalidMessage):
+            self.server.send_message(player, payload)
+
+            # player_disconnected removes the player once the connection
+            # is closed and lets a bot take over the seat
+            self.server.kick_client(player, 'invalid message')
+        else:
+            self.dispatch_message(player, payload)
 
     def dispatch_message(self, player, message):
+        """
+        Apply a message of a player to its game and answer it.
+
+        Every message is answered, echoing its id if it had one, with
+        success set to true or to false and an error. Rejected messages
+        have no effect on the game, the player may just go on.
+        Returns True if the message was accepted.
+        """
         tpe = message.type
+        logic = self.games.get(player)
 
         try:
             success = None
+            message.validate()
 
             if tpe == Message.Type.Echo:
                 # do nothing
                 success = True
+            elif logic is None:
+                msg = 'Player is not in a game.'
+                raise MachineError(msg)
+            elif not logic.is_current(player):
+                msg = 'Not the player\'s turn.'
+                raise MachineError(msg)
             elif tpe == Message.Type.Deploy:
-                success = self.logic.deploy(message)
+                success = logic.deploy(message)
             elif tpe == Message.Type.Attack:
-                success = self.logic.attack(message)
+                success = logic.attack(message)
             elif tpe == Message.Type.Move:
-                success = self.logic.move(message)
+                success = logic.move(message)
             elif tpe == Message.Type.Card:
-                success = self.logic.draw_card(message)
+                success = logic.draw_card(message)
             elif tpe == Message.Type.Bonus:
-                success = self.logic.bonus(message)
+                success = logic.bonus(message)
+            elif tpe == Message.Type.Finished:
+                success = logic.next_turn(message)
             else:
                 msg = 'Unknown message type.'
-                print(msg, message.type)
+                raise MachineError(msg)
 
             if not success:
                 msg = 'Preconditions for state change not fulfilled.'
                 raise MachineError(msg)
-        except MachineError:
-            self.logic.kick(player)
+        except MachineError as exc:
+            message.reject(exc.value)
+        except (KeyError, TypeError, ValueError):
+            # e.g. unknown country or troops that are not a positive int
+            message.reject('Invalid message data.')
+        except Exception as exc:  # pylint: disable=broad-except
+            # a bug must not leave the request without an answer
+            print('processing message failed: ', player, repr(exc))
+            message.reject('Internal error.')
         else:
-            if message.success:
-                self.server.send_message(player, message)
+            message.success = True
+        finally:
+            if logic is not None:
+                logic.release_messages()
+
+        if player not in self.bots:
+            self.server.send_message(player, message)
+
+        if not message.success:
+            return False
 
-            for (recipient, answer) in message.answers:
+        for (recipient, answer) in message.answers:
+            if recipient not in self.bots:
                 self.server.send_message(recipient, answer)
+        del message.answers[:]
+
+        if logic is not None:
+            if logic.is_finished():
+                self.finish_game(logic)
+            else:
+                self.schedule_bot(logic)
+
+        return True
 
 
 if __name__ == '__main__':
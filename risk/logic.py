@@ -1,9 +1,12 @@
+from collections import Counter
 from enum import Enum, unique
-import random
+import time
+import uuid
 
 from statemachine import Machine
 
 from . import messages as m
+from .rng import GameRandom
 
 
 @unique
@@ -27,17 +30,27 @@ class Player(object):
     Wrap a player identifier with additional information used during a game.
     """
 
-    def __init__(self, ident):
+    def __init__(self, ident, seat=0):
         """The player identifier."""
         self.ident = ident
+        """Position of the player in the game's list of players."""
+        self.seat = seat
         """Number of countries this player owns."""
         self.owned_countries = 0
         """Flag to check if the player may draw a card."""
         self.conquered_country_in_turn = False
         """Troops the player may deploy in this turn."""
         self.available_troops = 0
+        """Turn in which the player lost its last country, None if alive."""
+        self.eliminated_in_turn = None
         """The player's bonus cards."""
         self.cards = []
+        """Number of executed actions by trigger name."""
+        self.actions = Counter()
+        """Statistics of the current turn, see Logic.record_turn."""
+        self.attacks_in_turn = 0
+        self.attacks_won_in_turn = 0
+        self.cards_traded_in_turn = 0
 
     def __eq__(self, other):
         return self.ident == other.ident
@@ -62,12 +75,13 @@ class Action(object):
     new current player. Before checks and execution, prepare() is called.
     To simplify communicating the result or effects of an action,
     answer() can be used to send messages to the players that are affected.
+    Once the message is handled, release() drops the reference to it.
 
     Attributes:
     board, current_player, current_message, success
 
     Methods:
-    prepare, is_permitted, execute, next_turn, answer
+    prepare, is_permitted, execute, next_turn, answer, release
     """
 
     def __init__(self, board):
@@ -102,6 +116,10 @@ class Action(object):
 
         self.current_message.add_answer(player.ident, message)
 
+    def release(self):
+        """Forget the current message, so it is not kept alive."""
+        self.current_message = None
+
     @property
     def success(self):
         return self.current_message.success
@@ -114,7 +132,8 @@ class Action(object):
 class BonusAction(Action):
     def prepare(self, message):
         super().prepare(message)
-        self.bonus = None  # TODO
+        # raises KeyError for an unknown bonus
+        self.bonus = Bonus[message.bonus]
 
     def is_permitted(self, _):
         player_cards = self.current_player.cards.copy()
@@ -140,6 +159,7 @@ class BonusAction(Action):
 
         for card in bonus_cards:
             player_cards.remove(card)
+        player.cards_traded_in_turn += len(bonus_cards)
 
         self.success = True
 
@@ -162,6 +182,12 @@ class DeployAction(Action):
 
 
 class AttackAction(Action):
+    def __init__(self, board, rng, player_defeated=None):
+        super().__init__(board)
+        self.rng = rng
+        # called with a player that lost its last country
+        self.player_defeated = player_defeated
+
     def prepare(self, message):
         super().prepare(message)
         self.origin = self.board.country_for_name(message.origin)
@@ -193,26 +219,37 @@ class AttackAction(Action):
 
         self.origin.troops -= attack_losses
         self.destination.troops -= defend_losses
+        attacker.attacks_in_turn += 1
 
         if self.destination.troops == 0:
             # defending country is conquered
+            attacker.attacks_won_in_turn += 1
             attacker.owned_countries += 1
             defender.owned_countries -= 1
 
-            self.destination.troops = attack_troops
+            # surviving attackers move into the conquered country
+            survivors = attack_troops - attack_losses
+            self.origin.troops -= survivors
+            self.destination.troops = survivors
             self.destination.owner = attacker
 
             attacker.conquered_country_in_turn = True
+            if (defender.owned_countries == 0
+                    and self.player_defeated is not None):
+                self.player_defeated(defender)
 
-            self.answer(m.Conquered(self.destination), attacker)
-            self.answer(m.Defeated(self.destination), defender)
+            country = {'country': self.destination.name}
+            self.answer(m.Conquered(country), attacker)
+            self.answer(m.Defeated(country), defender)
         else:
             self.success = True
-            self.answer(m.Defended(self.destination, defend_losses), defender)
+            defended = {'country': self.destination.name,
+                        'losses': defend_losses}
+            self.answer(m.Defended(defended), defender)
 
     def _fight_for_country(self, attack_troops, defend_troops):
-        attack_dice = self._roll_dice(attack_troops)
-        defend_dice = self._roll_dice(defend_troops)
+        attack_dice = self.rng.roll_dice(attack_troops)
+        defend_dice = self.rng.roll_dice(defend_troops)
 
         attack_losses = 0
         defend_losses = 0
@@ -224,10 +261,6 @@ class AttackAction(Action):
 
         return attack_losses, defend_losses
 
-    @staticmethod
-    def _roll_dice(n):
-        return [random.randint(1, 6) for _ in range(n)].sort(reverse=True)
-
 
 class MoveAction(Action):
     def prepare(self, message):
@@ -253,37 +286,55 @@ class MoveAction(Action):
 
 
 class GetCardAction(Action):
+    CARDS = list(Card)
+
+    def __init__(self, board, rng):
+        super().__init__(board)
+        self.rng = rng
+
     def is_permitted(self, _):
         return self.current_player.conquered_country_in_turn
 
     def execute(self, _):
-        new_card = random.choice(list(Card))
+        new_card = self.rng.choice(GetCardAction.CARDS)
         self.current_player.cards.append(new_card)
         self.success = True
 
 
 class NextTurnAction(Action):
-    def __init__(self, board, players, actions):
+    def __init__(self, board, players, actions, turn_ended=None):
         super().__init__(board)
         # contains all players except the current one
-        self.players = players[1:]
-        # player whose turn it is now
-        self.current_player = players[0]
+        self.players = players[:-1]
+        # player whose turn it is now, the first turn goes to players[0]
+        self.current_player = players[-1]
         self.actions = actions
+        # number of turns started so far
+        self.turns = 0
+        # called with no arguments before a turn ends
+        self.turn_ended = turn_ended
 
     def next_turn(self, player):
         pass
 
     def execute(self, _):
-        # rotate list with current player
-        self.players.append(self.current_player)
-        self.current_player = self.players[0]
-        self.players = self.players[1:]
+        if self.turns > 0 and self.turn_ended is not None:
+            self.turn_ended()
+        self.turns += 1
+
+        # rotate list with current player, skip defeated players
+        for _ in range(len(self.players) + 1):
+            self.players.append(self.current_player)
+            self.current_player = self.players[0]
+            self.players = self.players[1:]
+
+            if self.current_player.owned_countries > 0:
+                break
 
         # TODO: probably more logic to set up the next player's turn
         player = self.current_player
         player.conquered_country_in_turn = False
-        player.available_troops = player.available_troops // 3
+        player.available_troops += max(3, player.owned_countries // 3)
 
         for action in self.actions:
             action.next_turn(player)
@@ -299,22 +350,39 @@ class Logic(object):
     if they are allowed according to the game's rules.
 
     Attributes:
-    board, players, machine
+    game_id, game_key, started, turns, rng, stats, board, players, machine
 
     Public Methods:
-    distribute_countries, is_ingame, kick
+    start, distribute_countries, is_ingame, is_current, is_finished,
+    standings, replace_player, release_messages, record_turn, kick
     """
 
-    def __init__(self, board, players):
-        """ Create a new Logic for the given board and players."""
+    def __init__(self, board, players, seed=None, stats=None, backend=None):
+        """
+        Create a new Logic for the given board and players.
+        All randomness of the game is derived from the seed and the backend
+        of risk.rng.GameRandom, a random seed is chosen if it is None and
+        NumPy is used if backend is None and it is available.
+        If stats is a risk.stats.TurnStats, statistics of every player are
+        appended to it after every turn.
+        """
+
+        """Unique identifier of this game."""
+        self.game_id = uuid.uuid4()
+        """Time the game was created."""
+        self.started = time.time()
+        """Random numbers, reproduced by rng.seed and rng.backend."""
+        self.rng = GameRandom(seed, backend=backend)
+        """Collector for per-turn statistics or None."""
+        self.stats = stats
 
         """Store the board of the game."""
         self.board = board
 
         """Store all participating players"""
         self.players = []
-        for ident in players:
-            self.players.append(Player(ident))
+        for seat, ident in enumerate(players):
+            self.players.append(Player(ident, seat))
 
         self.distribute_countries()
 
@@ -334,25 +402,32 @@ class Logic(object):
         # actions
         bonus = BonusAction(board)
         deploy = DeployAction(board)
-        attack = AttackAction(board)
-        get_card = GetCardAction(board)
+        attack = AttackAction(board, self.rng, self._player_defeated)
+        get_card = GetCardAction(board, self.rng)
         move = MoveAction(board)
 
         actions = [bonus, deploy, attack, get_card, move]
-        next_turn = NextTurnAction(board, players, actions)
+        next_turn = NextTurnAction(board, self.players, actions,
+                                   self.record_turn)
+        self.turn_action = next_turn
+        self.actions = actions + [next_turn]
 
 
         states = [before_start, start_of_turn, got_bonus,
                   deploying, attacking, moved, drew_card]
 
         def make_transition(trigger, source, dest, action):
+            def count(*_):
+                if action.current_player is not None:
+                    action.current_player.actions[trigger] += 1
+
             return {
                 'trigger': trigger,
                 'source': source,
                 'dest': dest,
                 'prepare': action.prepare,
                 'conditions': action.is_permitted,
-                'after': action.execute,
+                'after': [action.execute, count],
             }
 
         trans = [
@@ -384,13 +459,78 @@ class Logic(object):
         # TODO: is this a fair distribution?
         num_players = len(self.players)
         countries = self.board.countries_list()
-        random.shuffle(countries)
+        self.rng.shuffle(countries)
 
         for i, country in enumerate(countries):
             player = self.players[i % num_players]
             country.owner = player
+            country.troops = 1
             player.owned_countries += 1
 
+    @property
+    def game_key(self):
+        """
+        Integer identifier of this game, 63 random bits of game_id such
+        that it fits an int64 column. Used by the per-turn statistics and
+        stored with the game's result.
+        """
+        return self.game_id.int & (2 ** 63 - 1)
+
+    def start(self):
+        """Start the first turn."""
+        self.next_turn(None)
+
+    @property
+    def current_player(self):
+        """The Player whose turn it is."""
+        return self.turn_action.current_player
+
+    def is_current(self, ident):
+        """Check if it is the turn of the player with the given ident."""
+        return self.current_player.ident == ident
+
+    def replace_player(self, ident, new_ident):
+        """Let someone else take over the seat of a player."""
+        for player in self.players:
+            if player.ident == ident:
+                player.ident = new_ident
+
+    def _player_defeated(self, player):
+        player.eliminated_in_turn = self.turns
+
+    def release_messages(self):
+        """Let all actions forget the last handled message."""
+        for action in self.actions:
+            action.release()
+
+    def record_turn(self):
+        """
+        Append the statistics of all players in the current turn to stats
+        and reset the counters of the turn. Called at the end of every
+        turn, call it once more when the game is finished.
+        """
+        players = self.players
+
+        if self.stats is not None:
+            troops = [0] * len(players)
+            for country in self.board.countries_list():
+                if country.owner is not None:
+                    troops[country.owner.seat] += country.troops
+
+            game = self.game_key
+            turn = self.turns
+            for player in players:
+                self.stats.append(
+                    game, turn, player.seat, troops[player.seat],
+                    player.owned_countries, player.attacks_in_turn,
+                    player.attacks_won_in_turn, player.cards_traded_in_turn
+                )
+
+        for player in players:
+            player.attacks_in_turn = 0
+            player.attacks_won_in_turn = 0
+            player.cards_traded_in_turn = 0
+
     def is_ingame(self, player):
         """Check if a player participates in the game."""
         participants = self.players
@@ -400,6 +540,28 @@ class Logic(object):
 
         return player in participants
 
+    @property
+    def turns(self):
+        """Number of turns played so far."""
+        return self.turn_action.turns
+
+    def is_finished(self):
+        """Check if a single player owns all countries."""
+        return sum(1 for p in self.players if p.owned_countries > 0) <= 1
+
+    def standings(self):
+        """
+        Return the players ordered by owned countries, leader first.
+        Eliminated players follow, the one that lasted longest first.
+        """
+        def rank(player):
+            eliminated = player.eliminated_in_turn
+            if eliminated is None:
+                eliminated = float('inf')
+            return (player.owned_countries, eliminated)
+
+        return sorted(self.players, key=rank, reverse=True)
+
     def kick(self, player):
         """Kick a player from the game."""
         # TODO: remove player from game, board, etc.
@@ -0,0 +1,179 @@
+import bisect
+from collections import OrderedDict, namedtuple
+import time
+
+
+"""A player waiting for a game."""
+Ticket = namedtuple('Ticket', ['player', 'rating', 'enqueued'])
+
+
+class Matchmaker(object):
+    """
+    Queue of players waiting for a game, bucketed by rating.
+
+    Waiting players are kept in buckets of equal rating width, in the
+    order they arrived. A game is formed around an anchor ticket from the
+    buckets around the anchor's rating. The allowed rating gap starts at
+    base_gap and grows with the time the anchor has been waiting, so
+    nobody waits forever. Only the oldest ticket of a bucket is ever
+    used as an anchor, because it has the widest gap.
+
+    Forming a match costs O(log b + k) for b non-empty buckets and k
+    players per game, plus the players skipped in the two buckets at the
+    edges of the gap, independent of the number of waiting players.
+
+    Public Methods:
+    enqueue, remove, match, match_waiting, take_overdue
+    """
+
+    DEFAULT_RATING = 1500
+    BUCKET_WIDTH = 100
+    BASE_GAP = 100
+    """Rating points the gap grows per second waited."""
+    GAP_GROWTH = 10
+
+    def __init__(self, players_per_game, bucket_width=BUCKET_WIDTH,
+                 base_gap=BASE_GAP, gap_growth=GAP_GROWTH,
+                 clock=time.monotonic):
+        self.players_per_game = players_per_game
+        self.bucket_width = bucket_width
+        self.base_gap = base_gap
+        self.gap_growth = gap_growth
+        self.clock = clock
+
+        # bucket index -> OrderedDict of player -> Ticket, oldest first
+        self.buckets = {}
+        # sorted indices of all non-empty buckets
+        self.bucket_keys = []
+        # player -> Ticket of all waiting players, oldest first
+        self.tickets = OrderedDict()
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def __contains__(self, player):
+        return player in self.tickets
+
+    def _bucket_key(self, rating):
+        return int(rating // self.bucket_width)
+
+    def enqueue(self, player, rating=DEFAULT_RATING):
+        """Add a player to the queue."""
+        ticket = Ticket(player, rating, self.clock())
+        self.tickets[player] = ticket
+
+        key = self._bucket_key(rating)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = OrderedDict()
+            self.buckets[key] = bucket
+            bisect.insort(self.bucket_keys, key)
+
+        bucket[player] = ticket
+
+    def remove(self, player):
+        """Remove a player from the queue, ignore unknown players."""
+        ticket = self.tickets.pop(player, None)
+        if ticket is None:
+            return
+
+        key = self._bucket_key(ticket.rating)
+        bucket = self.buckets[key]
+        del bucket[player]
+
+        if not bucket:
+            del self.buckets[key]
+            del self.bucket_keys[bisect.bisect_left(self.bucket_keys, key)]
+
+    def gap(self, ticket, now):
+        """Allowed rating difference for a ticket at the given time."""
+        return self.base_gap + self.gap_growth * (now - ticket.enqueued)
+
+    def match(self, player):
+        """
+        Try to form a game around a waiting player.
+        Returns the players of the game, which are removed from the queue,
+        or None if not enough compatible players are waiting.
+        """
+        ticket = self.tickets.get(player)
+        if ticket is None or len(self.tickets) < self.players_per_game:
+            return None
+
+        gap = self.gap(ticket, self.clock())
+        low = self._bucket_key(ticket.rating - gap)
+        high = self._bucket_key(ticket.rating + gap)
+
+        chosen = [player]
+        for key in self._keys_by_distance(self._bucket_key(ticket.rating),
+                                          low, high):
+            for other, other_ticket in self.buckets[key].items():
+                if len(chosen) == self.players_per_game:
+                    break
+                # buckets at the edges are only partly within the gap
+                if (other != player
+                        and abs(other_ticket.rating - ticket.rating) <= gap):
+                    chosen.append(other)
+
+            if len(chosen) == self.players_per_game:
+                for chosen_player in chosen:
+                    self.remove(chosen_player)
+                return chosen
+
+        return None
+
+    def _keys_by_distance(self, center, low, high):
+        """Yield non-empty bucket keys in [low, high], nearest first."""
+        keys = self.bucket_keys
+        right = bisect.bisect_left(keys, center)
+        left = right - 1
+
+        while True:
+            can_go_left = left >= 0 and keys[left] >= low
+            can_go_right = right < len(keys) and keys[right] <= high
+
+            if can_go_left and (not can_go_right
+                                or center - keys[left] < keys[right] - center):
+                yield keys[left]
+                left -= 1
+            elif can_go_right:
+                yield keys[right]
+                right += 1
+            else:
+                return
+
+    def match_waiting(self):
+        """
+        Form as many games as possible, anchored at the oldest player of
+        every bucket. Returns a list of games, each a list of players.
+        """
+        games = []
+
+        anchors = [next(iter(self.buckets[key])) for key in self.bucket_keys]
+        anchors.sort(key=lambda p: self.tickets[p].enqueued)
+
+        for player in anchors:
+            if player in self.tickets:
+                game = self.match(player)
+                if game is not None:
+                    games.append(game)
+
+        return games
+
+    def take_overdue(self, wait):
+        """
+        Remove and return up to players_per_game players, oldest first,
+        that have been waiting for at least wait seconds.
+        """
+        now = self.clock()
+        overdue = []
+
+        for ticket in self.tickets.values():
+            if (now - ticket.enqueued < wait
+                    or len(overdue) == self.players_per_game):
+                break
+            overdue.append(ticket.player)
+
+        for player in overdue:
+            self.remove(player)
+
+        return overdue
@@ -22,11 +22,12 @@ class Message(object):
         Card = 8
         Bonus = 9
 
+        Finished = 13  # player finished the turn
+
         # not yet implemented
         GameEnd = 10
         Kick = 11
         Quit = 12
-        Finished = 13
 
         def __call__(self, cls):
             self.message_class = cls
@@ -35,6 +36,8 @@ class Message(object):
 
 
     fields = []
+    """Fields that must be positive integers, see validate."""
+    positive_fields = []
 
     def __init__(self, data, ident=None):
         for attr in self.fields:
@@ -45,6 +48,7 @@ class Message(object):
 
         self.ident = ident
         self.success = None
+        self.error = None
         self.answers = []
 
     def _json_data(self):
@@ -63,9 +67,24 @@ class Message(object):
             message_json['id'] = self.ident
         if self.success is not None:
             message_json['success'] = self.success
+        if self.error is not None:
+            message_json['error'] = self.error
 
         return message_json
 
+    def validate(self):
+        """Raise ValueError if a field has a value of the wrong kind."""
+        for attr in self.positive_fields:
+            value = getattr(self, attr)
+            # bool is a subclass of int but no number of troops
+            if type(value) is not int or value < 1:
+                raise ValueError('Invalid field %s' % attr)
+
+    def reject(self, error):
+        """Mark the message as failed for the given reason."""
+        self.success = False
+        self.error = error
+
     def add_answer(self, player, message):
         self.answers.append((player, message))
 
@@ -84,11 +103,13 @@ class EchoMessage(Message):
 @Message.Type.Deploy
 class Deploy(Message):
     fields = ['country', 'troops']
+    positive_fields = ['troops']
 
 
 @Message.Type.Attack
 class Attack(Message):
     fields = ['origin', 'destination', 'attack_troops']
+    positive_fields = ['attack_troops']
 
 
 @Message.Type.Conquered
@@ -109,6 +130,7 @@ class Defended(Message):
 @Message.Type.Move
 class Move(Message):
     fields = ['origin', 'destination', 'troops']
+    positive_fields = ['troops']
 
 
 @Message.Type.Card
@@ -118,10 +140,15 @@ class Card(Message):
 
 @Message.Type.Bonus
 class Bonus(Message):
-    # TODO: see logic.py:84
+    # name of a risk.logic.Bonus
     fields = ['bonus']
 
 
+@Message.Type.Finished
+class Finished(Message):
+    pass
+
+
 class MessageParser(object):
     """Parser for Messages"""
     def __init__(self):
@@ -132,15 +159,50 @@ class MessageParser(object):
     def parse(self, payload):
         try:
             payload_json = json.loads(payload)
+        except json.JSONDecodeError:
+            raise ParseError
+
+        return self.parse_json(payload_json)
+
+    def parse_json(self, payload_json):
+        """Create a Message from an already decoded payload."""
+        try:
             message_type = Message.Type(payload_json['type'])
             message_class = message_type.message_class
             message_data = payload_json['data']
             message_id = payload_json.get('id', None)
 
             return message_class(message_data, message_id)
-        except (json.JSONDecodeError, ValueError, KeyError):
+        except (ValueError, KeyError, TypeError, AttributeError):
             raise ParseError
 
+    @staticmethod
+    def peek_id(payload):
+        """Return the id of a payload or None if it has none."""
+        try:
+            return json.loads(payload).get('id', None)
+        except (json.JSONDecodeError, AttributeError):
+            return None
+
+
+
+class InvalidMessage(object):
+    """Answer to a payload that could not be parsed into a Message."""
+
+    # has no valid type, see Message.Type
+    type = None
+
+    def __init__(self, ident, error):
+        self.ident = ident
+        self.error = error
+
+    def json(self):
+        message_json = {'success': False, 'error': self.error}
+        if self.ident is not None:
+            message_json['id'] = self.ident
+
+        return message_json
+
 
 class ParseError(Exception):
     """Thrown when parsing fails."""
@@ -0,0 +1,93 @@
+from collections import namedtuple
+from enum import Enum, unique
+import time
+
+
+@unique
+class Policy(Enum):
+    """What to do with a client that exceeds its limit."""
+    DELAY = 1  # hold back the message until enough tokens are available
+    KICK = 2  # drop the connection
+
+
+"""
+Limit for one kind of message: rate in tokens per second, burst is the
+bucket's capacity, policy is applied when the bucket runs dry.
+"""
+Limit = namedtuple('Limit', ['rate', 'burst', 'policy'])
+
+
+class TokenBucket(object):
+    """Token bucket that refills continuously at a fixed rate."""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def consume(self, now, tokens=1):
+        """
+        Take tokens out of the bucket.
+        Returns 0 on success, otherwise the number of seconds until enough
+        tokens will be available. Nothing is taken if the bucket is short.
+        """
+        elapsed = now - self.stamp
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.stamp = now
+
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0
+
+        return (tokens - self.tokens) / self.rate
+
+
+class RateLimiter(object):
+    """
+    Token bucket limits per client and message kind.
+
+    Each client gets one bucket for every kind of message it sends.
+    Kinds without an explicit limit share the default limit.
+    """
+
+    def __init__(self, limits, default, clock=time.monotonic):
+        self.limits = dict(limits)
+        self.default = default
+        self.clock = clock
+        self.buckets = {}
+
+    def acquire(self, client_id, kind):
+        """
+        Account one message of the given kind for a client.
+        Returns the number of seconds the message has to be delayed,
+        0 if it may be processed immediately.
+        Raises RateLimitExceeded if the limit's policy is to kick.
+        """
+        limit = self.limits.get(kind, self.default)
+        now = self.clock()
+
+        client_buckets = self.buckets.setdefault(client_id, {})
+        bucket = client_buckets.get(kind)
+        if bucket is None:
+            bucket = TokenBucket(limit.rate, limit.burst, now)
+            client_buckets[kind] = bucket
+
+        delay = bucket.consume(now)
+        if delay and limit.policy == Policy.KICK:
+            raise RateLimitExceeded(client_id, kind)
+
+        return delay
+
+    def remove_client(self, client_id):
+        """Forget all buckets of a client."""
+        self.buckets.pop(client_id, None)
+
+
+class RateLimitExceeded(Exception):
+    """Thrown when a client exceeds a limit with the kick policy."""
+    def __init__(self, client_id, kind):
+        super().__init__(client_id, kind)
+        self.client_id = client_id
+        self.kind = kind
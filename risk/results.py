@@ -0,0 +1,311 @@
+from collections import namedtuple
+import queue
+import sqlite3
+import threading
+import time
+
+
+"""
+Final standing of one player in a finished game. bot is the name of the
+bot's class if a bot played the seat, None for a human.
+"""
+Placement = namedtuple('Placement', [
+    'player', 'place', 'countries',
+    'deploys', 'attacks', 'moves', 'cards', 'bonuses', 'bot'
+], defaults=[None])
+
+
+class GameResult(namedtuple('GameResult', [
+        'game_id', 'game_key', 'seed', 'backend', 'started', 'finished',
+        'turns', 'placements'])):
+    """
+    Outcome of a finished game. game_key is the integer the game's rows
+    in the per-turn statistics are stored under, see Logic.game_key.
+    """
+
+    @classmethod
+    def from_logic(cls, logic, finished=None, bots=None):
+        """
+        Collect the result of the game played by the given Logic.
+        bots maps the idents of built-in players to their risk.bots.Bot.
+        """
+        if finished is None:
+            finished = time.time()
+        if bots is None:
+            bots = {}
+
+        placements = []
+        for place, player in enumerate(logic.standings(), 1):
+            actions = player.actions
+            bot = bots.get(player.ident)
+            placements.append(Placement(
+                str(player.ident), place, player.owned_countries,
+                actions['deploy'], actions['attack'], actions['move'],
+                actions['draw_card'], actions['bonus'],
+                None if bot is None else type(bot).__name__
+            ))
+
+        return cls(str(logic.game_id), logic.game_key, logic.rng.seed,
+                   logic.rng.backend, logic.started, finished, logic.turns,
+                   placements)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    game_key INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    backend TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL NOT NULL,
+    turns INTEGER NOT NULL,
+    winner TEXT
+);
+CREATE INDEX IF NOT EXISTS games_finished ON games (finished);
+CREATE INDEX IF NOT EXISTS games_key ON games (game_key);
+
+CREATE TABLE IF NOT EXISTS placements (
+    game_id TEXT NOT NULL,
+    player TEXT NOT NULL,
+    place INTEGER NOT NULL,
+    finished REAL NOT NULL,
+    countries INTEGER NOT NULL,
+    deploys INTEGER NOT NULL,
+    attacks INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    cards INTEGER NOT NULL,
+    bonuses INTEGER NOT NULL,
+    bot TEXT,
+    PRIMARY KEY (game_id, player)
+);
+CREATE INDEX IF NOT EXISTS placements_history
+    ON placements (player, finished DESC);
+
+CREATE TABLE IF NOT EXISTS kicks (
+    game_id TEXT NOT NULL,
+    player TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS kicks_player ON kicks (player, at);
+
+CREATE TABLE IF NOT EXISTS player_stats (
+    player TEXT PRIMARY KEY,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    place_sum INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS player_stats_wins
+    ON player_stats (wins DESC, games);
+"""
+
+
+class ResultStore(object):
+    """
+    Persist game results, placements and kicks in a SQLite file.
+
+    All writes are handed to a background thread which commits them in
+    batches, so callers never wait for the disk. Aggregates for the
+    leaderboard are maintained on insert in player_stats, such that
+    reading it does not have to scan all recorded games. Bots get a new
+    ident for every game, so their aggregates are kept per class, under
+    the name bot:<class name>.
+
+    Public Methods:
+    record_game, record_kick, flush, close, leaderboard, history
+    """
+
+    BATCH_SIZE = 256
+    """Seconds to wait for more writes before committing a batch."""
+    BATCH_DELAY = 0.5
+
+    _STOP = object()
+
+    def __init__(self, path, batch_size=BATCH_SIZE, batch_delay=BATCH_DELAY):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(
+            target=self._write_batches, name='ResultStore', daemon=True
+        )
+
+        # create schema before anyone can read
+        connection = self._connect()
+        try:
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+        self.writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        return connection
+
+    def record_game(self, result):
+        """Queue a GameResult for writing."""
+        self._put((self._insert_game, result))
+
+    def record_kick(self, game_id, player, reason):
+        """Queue a kicked player for writing."""
+        kick = (str(game_id), str(player), reason, time.time())
+        self._put((self._insert_kick, kick))
+
+    def _put(self, item):
+        # nobody would ever write the item
+        if not self.writer.is_alive():
+            raise RuntimeError('ResultStore is closed')
+        self.queue.put(item)
+
+    def flush(self):
+        """
+        Block until everything queued so far is committed.
+        Returns immediately if the writer thread is not running anymore.
+        """
+        done = threading.Event()
+        self.queue.put((None, done))
+
+        # the writer may stop before it gets to the event, e.g. on close
+        while not done.wait(0.1):
+            if not self.writer.is_alive():
+                return
+
+    def close(self):
+        """Commit all queued writes and stop the writer thread."""
+        if self.writer.is_alive():
+            self.queue.put(ResultStore._STOP)
+            self.writer.join()
+
+    def _write_batches(self):
+        connection = self._connect()
+        try:
+            while True:
+                batch, stop = self._next_batch()
+                flushed = [item for (write, item) in batch if write is None]
+                writes = [entry for entry in batch if entry[0] is not None]
+
+                try:
+                    if not self._write(connection, writes):
+                        # retry one by one, a bad write must not lose the
+                        # whole batch
+                        for entry in writes:
+                            self._write(connection, [entry])
+                finally:
+                    for done in flushed:
+                        done.set()
+
+                if stop:
+                    break
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _write(connection, writes):
+        """
+        Apply the writes in a single transaction. Returns False if it was
+        rolled back, the writer thread must survive any failure.
+        """
+        try:
+            with connection:
+                cursor = connection.cursor()
+                for (write, item) in writes:
+                    write(cursor, item)
+        except Exception as exc:  # pylint: disable=broad-except
+            # e.g. values that do not fit an SQLite INTEGER
+            print('writing %d results failed: ' % len(writes), repr(exc))
+            return False
+
+        return True
+
+    def _next_batch(self):
+        batch = []
+        item = self.queue.get()
+        deadline = time.monotonic() + self.batch_delay
+
+        while item is not ResultStore._STOP:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+
+            try:
+                timeout = max(0, deadline - time.monotonic())
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                return batch, False
+
+        return batch, True
+
+    @staticmethod
+    def _insert_game(cursor, result):
+        winner = None
+        if result.placements:
+            winner = result.placements[0].player
+
+        cursor.execute(
+            'INSERT OR IGNORE INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (result.game_id, result.game_key, result.seed, result.backend,
+             result.started, result.finished, result.turns, winner)
+        )
+        if cursor.rowcount == 0:
+            # game was recorded before, do not count it twice
+            return
+
+        cursor.executemany(
+            'INSERT INTO placements '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(result.game_id, p.player, p.place, result.finished,
+              p.countries, p.deploys, p.attacks, p.moves, p.cards, p.bonuses,
+              p.bot)
+             for p in result.placements]
+        )
+
+        names = [p.player if p.bot is None else 'bot:' + p.bot
+                 for p in result.placements]
+        cursor.executemany(
+            'INSERT OR IGNORE INTO player_stats (player) VALUES (?)',
+            [(name,) for name in names]
+        )
+        cursor.executemany(
+            'UPDATE player_stats SET games = games + 1, wins = wins + ?, '
+            'place_sum = place_sum + ? WHERE player = ?',
+            [(int(p.place == 1), p.place, name)
+             for p, name in zip(result.placements, names)]
+        )
+
+    @staticmethod
+    def _insert_kick(cursor, kick):
+        cursor.execute('INSERT INTO kicks VALUES (?, ?, ?, ?)', kick)
+
+    def leaderboard(self, limit=10):
+        """
+        Return (player, games, wins, average place) of the players with
+        the most wins. Reads the database directly, so do not call it from
+        the event loop.
+        """
+        return self._query(
+            'SELECT player, games, wins, CAST(place_sum AS REAL) / games '
+            'FROM player_stats ORDER BY wins DESC, games ASC LIMIT ?',
+            (limit,)
+        )
+
+    def history(self, player, limit=20):
+        """
+        Return the latest placements of a player, newest first, as
+        (game_id, finished, place, countries) tuples.
+        Reads the database directly, so do not call it from the event loop.
+        """
+        return self._query(
+            'SELECT game_id, finished, place, countries FROM placements '
+            'WHERE player = ? ORDER BY finished DESC LIMIT ?',
+            (str(player), limit)
+        )
+
+    def _query(self, sql, parameters):
+        connection = self._connect()
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
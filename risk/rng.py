@@ -0,0 +1,128 @@
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class _Block(object):
+    """Pre-generated uniform integers in [low, high], refilled in bulk."""
+
+    def __init__(self, draw, low, high, size):
+        self.draw = draw
+        self.low = low
+        self.high = high
+        self.size = size
+        self.values = []
+        self.position = 0
+
+    def take(self, n):
+        """Return the next n values."""
+        end = self.position + n
+        if end > len(self.values):
+            self._refill(n)
+            end = n
+
+        values = self.values[self.position:end]
+        self.position = end
+        return values
+
+    def next(self):
+        """Return the next value."""
+        if self.position >= len(self.values):
+            self._refill(1)
+
+        value = self.values[self.position]
+        self.position += 1
+        return value
+
+    def _refill(self, n):
+        # leftover values are dropped, this keeps the stream simple
+        # and does not affect reproducibility
+        self.values = self.draw(self.low, self.high, max(n, self.size))
+        self.position = 0
+
+
+class GameRandom(object):
+    """
+    Independent stream of random numbers for a single game.
+
+    The stream is fully determined by the seed, so a game can be replayed
+    by creating its Logic with the recorded seed and backend. Dice and
+    cards are taken from pre-generated blocks which are generated by NumPy
+    if available. NumPy and the random module produce different streams
+    for the same seed, so a replay must use the same backend, see BACKENDS.
+
+    Attributes:
+    seed, backend
+
+    Public Methods:
+    roll_dice, choice, shuffle
+    """
+
+    BACKENDS = ('numpy', 'python')
+    BLOCK_SIZE = 1024
+    """Seeds are limited to 63 bits such that they fit an SQLite INTEGER."""
+    SEED_BITS = 63
+
+    def __init__(self, seed=None, block_size=BLOCK_SIZE, backend=None):
+        """
+        Create the stream for a seed, a random seed is chosen if it is None.
+        backend is one of BACKENDS or None for NumPy if it is available.
+        """
+        if backend is None:
+            backend = 'python' if np is None else 'numpy'
+        if backend not in GameRandom.BACKENDS:
+            raise ValueError('Unknown backend %s' % backend)
+        if backend == 'numpy' and np is None:
+            raise ValueError('Backend numpy requires NumPy')
+
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(GameRandom.SEED_BITS)
+        if (not isinstance(seed, int)
+                or not 0 <= seed < 2 ** GameRandom.SEED_BITS):
+            raise ValueError('Seed must be an int in [0, 2**%d)'
+                             % GameRandom.SEED_BITS)
+
+        self.seed = seed
+        # used for shuffling only, independent of the blocks
+        self.random = random.Random(seed)
+
+        self.backend = backend
+        if backend == 'numpy':
+            self.generator = np.random.default_rng(seed)
+            draw = self._draw_numpy
+        else:
+            self.generator = random.Random(seed + 1)
+            draw = self._draw_python
+
+        self.dice = _Block(draw, 1, 6, block_size)
+        self.choices = {}
+        self.draw = draw
+        self.block_size = block_size
+
+    def _draw_numpy(self, low, high, size):
+        return self.generator.integers(low, high + 1, size).tolist()
+
+    def _draw_python(self, low, high, size):
+        return self.generator.choices(range(low, high + 1), k=size)
+
+    def roll_dice(self, n):
+        """Roll n six-sided dice, sorted from highest to lowest."""
+        return sorted(self.dice.take(n), reverse=True)
+
+    def choice(self, population):
+        """Return a random element of a non-empty sequence."""
+        size = len(population)
+
+        block = self.choices.get(size)
+        if block is None:
+            block = _Block(self.draw, 0, size - 1, self.block_size)
+            self.choices[size] = block
+
+        return population[block.next()]
+
+    def shuffle(self, items):
+        """Shuffle a list in place."""
+        self.random.shuffle(items)
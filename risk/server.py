@@ -1,35 +1,102 @@
 import asyncio as aio
+from collections import deque
 import json
 import uuid
 
+from .ratelimit import RateLimitExceeded
+
 
 class Server(object):
-    """Server handling communication with clients"""
+    """
+    Server handling communication with clients
+
+    Incoming lines are decoded once, queued per client and processed one
+    at a time by a single scheduler task. The scheduler serves groups of
+    clients (e.g. the players of one game) round-robin and, within a
+    group, every client round-robin, so a chatty client only ever delays
+    its own messages.
+    """
+
+    """
+    Maximum number of messages a client may send ahead without waiting for
+    the answers, i.e. queued messages, before it is kicked.
+    """
+    MAX_PENDING = 64
+    """
+    Maximum number of bytes written to a client but not yet sent, e.g.
+    because it does not read its answers, before it is kicked.
+    """
+    MAX_WRITE_BUFFER = 256 * 1024
+
     class Callbacks(object):
         """Contains methods for any type of event happening in the server"""
         async def player_connected(self, player):
             pass
 
-        async def player_disconnected(self, player):
+        async def player_disconnected(self, player, reason='disconnected'):
+            """reason tells why the server kicked the player, if it did."""
             pass
 
+        def decode(self, player, line):
+            """Decode a received line, the result is passed on as payload."""
+            return line
+
         async def message(self, player, payload):
             pass
 
-    def __init__(self, server_callbacks, loop):
+        def classify(self, player, payload):
+            """Return the kind of a payload used for rate limiting."""
+            return None
+
+        def client_group(self, player):
+            """Return the group a player is scheduled in, e.g. its game."""
+            return None
+
+    def __init__(self, server_callbacks, loop, rate_limiter=None,
+                 max_pending=MAX_PENDING, max_write_buffer=MAX_WRITE_BUFFER):
         self.server = None
         self.server_callbacks = server_callbacks
         self.loop = loop
         self.clients = {}
 
+        self.rate_limiter = rate_limiter
+        self.max_pending = max_pending
+        self.max_write_buffer = max_write_buffer
+
+        # pending messages of every client
+        self.inboxes = {}
+        # clients that are waiting for the scheduler, by group
+        self.ready_clients = {}
+        # groups with at least one ready client in round-robin order
+        self.ready_groups = deque()
+        # clients that are queued, being processed or held back by the
+        # rate limiter, i.e. will be looked at again without a new message
+        self.active = set()
+        self.wakeup = aio.Event()
+        self.scheduler = None
+        # clients with a running drain task
+        self.draining = set()
+        # why clients were kicked until their connection is closed
+        self.kick_reasons = {}
+
     def run(self, host, port):
-        server_coro = aio.streams.start_server(
+        # the loop argument is gone since Python 3.10, start_server
+        # uses the current loop, which self.loop is
+        server_coro = aio.start_server(
             self._accept_client,
-            host, port,
-            loop=self.loop
+            host, port
         )
 
         self.server = self.loop.run_until_complete(server_coro)
+        self.scheduler = self.loop.create_task(self._process_messages())
+
+    def close(self):
+        """Stop accepting clients and processing messages."""
+        self.server.close()
+        self.scheduler.cancel()
+
+        return aio.gather(self.server.wait_closed(), self.scheduler,
+                          return_exceptions=True)
 
     def _accept_client(self, client_reader, client_writer):
         client_id = self.register_client(client_reader, client_writer)
@@ -44,7 +111,12 @@ class Server(object):
         )
 
         while True:
-            data = await reader.readline()
+            try:
+                data = await reader.readline()
+            except ConnectionError:
+                # treat like a regular disconnect, the client must be
+                # unregistered in any case
+                break
             if not data:
                 break
 
@@ -52,36 +124,170 @@ class Server(object):
             self.handle_message(client_id, data.rstrip())
 
         self.unregister_client(client_id)
+        reason = self.kick_reasons.pop(client_id, 'disconnected')
         self.loop.create_task(
-            self.server_callbacks.player_disconnected(client_id)
+            self.server_callbacks.player_disconnected(client_id, reason)
         )
 
     def handle_message(self, client_id, message):
-        self.loop.create_task(
-            self.server_callbacks.message(client_id, message)
-        )
+        inbox = self.inboxes.get(client_id)
+        if inbox is None:
+            # client was kicked, ignore the rest of its input
+            return
+
+        if len(inbox) >= self.max_pending:
+            self.kick_client(client_id, 'too many pending messages')
+            return
+
+        inbox.append(self.server_callbacks.decode(client_id, message))
+        if client_id not in self.active:
+            self._schedule(client_id)
+
+    def _schedule(self, client_id):
+        group = self.server_callbacks.client_group(client_id)
+
+        clients = self.ready_clients.get(group)
+        if clients is None:
+            clients = deque()
+            self.ready_clients[group] = clients
+            self.ready_groups.append(group)
+
+        clients.append(client_id)
+        self.active.add(client_id)
+        self.wakeup.set()
+
+    def _resume(self, client_id):
+        if client_id in self.inboxes:
+            self._schedule(client_id)
+
+    def _next_client(self):
+        group = self.ready_groups.popleft()
+        clients = self.ready_clients[group]
+        client_id = clients.popleft()
+
+        if clients:
+            self.ready_groups.append(group)
+        else:
+            del self.ready_clients[group]
+
+        return client_id
+
+    async def _process_messages(self):
+        while True:
+            if not self.ready_groups:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            await self._process_next(self._next_client())
+
+            # let readers and writers run between two messages
+            await aio.sleep(0)
+
+    async def _process_next(self, client_id):
+        inbox = self.inboxes.get(client_id)
+        if not inbox:
+            # client disconnected in the meantime
+            return
+
+        payload = inbox[0]
+
+        if self.rate_limiter is not None:
+            kind = self.server_callbacks.classify(client_id, payload)
+            try:
+                delay = self.rate_limiter.acquire(client_id, kind)
+            except RateLimitExceeded:
+                self.kick_client(client_id, 'rate limit exceeded')
+                return
+
+            if delay:
+                # stays active until the timer reschedules it
+                self.loop.call_later(delay, self._resume, client_id)
+                return
+
+        inbox.popleft()
+        try:
+            await self.server_callbacks.message(client_id, payload)
+        except Exception as exc:  # pylint: disable=broad-except
+            # a single broken message must not stop the scheduler
+            print('processing message failed: ', client_id, exc)
+
+        if inbox:
+            self._schedule(client_id)
+        else:
+            self.active.discard(client_id)
 
     def register_client(self, client_reader, client_writer):
         new_id = uuid.uuid4()
         self.clients[new_id] = (client_reader, client_writer)
+        self.inboxes[new_id] = deque()
 
         return new_id
 
     def unregister_client(self, client_id):
         del self.clients[client_id]
+        self._forget_client(client_id)
 
-    def send_message(self, client_id, message):
-        self.loop.create_task(
-            self._send_message(client_id, message)
-        )
+    def kick_client(self, client_id, reason='kicked', abort=False):
+        """
+        Drop the connection to a client. Its pending messages are discarded,
+        player_disconnected is called with the reason once the connection
+        is closed. If abort is True, unsent data is discarded as well
+        instead of waiting for the client to receive it.
+        """
+        self._forget_client(client_id)
 
-    async def _send_message(self, client_id, message):
         try:
             _, writer = self.clients[client_id]
         except KeyError:
-            # client disconnected in the meantime, ignore failure on purpose
             pass
         else:
-            serial = json.dumps(message.json()) + '\n'
-            writer.write(serial.encode('utf-8'))
+            self.kick_reasons.setdefault(client_id, reason)
+            if abort:
+                writer.transport.abort()
+            else:
+                writer.close()
+
+    def _forget_client(self, client_id):
+        self.inboxes.pop(client_id, None)
+        self.active.discard(client_id)
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.remove_client(client_id)
+
+    def send_message(self, client_id, message):
+        """
+        Send a message to a client. Messages are written immediately, so
+        they arrive in the order send_message is called.
+        """
+        try:
+            _, writer = self.clients[client_id]
+        except KeyError:
+            # client disconnected in the meantime, ignore failure on purpose
+            return
+        if client_id not in self.inboxes:
+            # client was kicked, its connection is being closed
+            return
+
+        serial = json.dumps(message.json()) + '\n'
+        writer.write(serial.encode('utf-8'))
+
+        if writer.transport.get_write_buffer_size() > self.max_write_buffer:
+            # the client does not read its answers, closing would wait
+            # for it to read them
+            self.kick_client(client_id, 'not reading', abort=True)
+            return
+
+        # a single drain per client at a time, they must not run concurrently
+        if client_id not in self.draining:
+            self.draining.add(client_id)
+            self.loop.create_task(self._drain(client_id, writer))
+
+    async def _drain(self, client_id, writer):
+        try:
             await writer.drain()  # sth sth control flow
+        except ConnectionError:
+            # client disconnected in the meantime, ignore failure on purpose
+            pass
+        finally:
+            self.draining.discard(client_id)
@@ -0,0 +1,183 @@
+from array import array
+import ast
+import os
+import sys
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+"""Columns of the per-turn statistics, one row per player and turn."""
+COLUMNS = ('game', 'turn', 'player', 'troops', 'territories',
+           'attacks', 'attacks_won', 'cards_traded')
+
+# npy files start with a header of this many bytes, see _NpyColumn
+_NPY_HEADER = 128
+
+
+class _NpyColumn(object):
+    """
+    Single int64 column in NumPy's .npy format, written without NumPy.
+
+    The header has a fixed size and is rewritten with the new length after
+    every append, so the file is a valid array at any time and can be
+    loaded with numpy.load(path, mmap_mode='r'). An existing file is
+    appended to.
+    """
+
+    def __init__(self, path):
+        if os.path.exists(path):
+            self.file = open(path, 'r+b')
+            self.truncate(read_npy_length(path))
+        else:
+            self.file = open(path, 'wb')
+            self.truncate(0)
+
+    def truncate(self, length):
+        """Drop all values after the first length ones."""
+        self.length = length
+        # values written after the header was last updated are dropped too
+        self.file.truncate(_NPY_HEADER + 8 * length)
+        self._write_header()
+
+    def _write_header(self):
+        order = '<' if sys.byteorder == 'little' else '>'
+        header = ("{'descr': '%si8', 'fortran_order': False, "
+                  "'shape': (%d,), }" % (order, self.length))
+        header = header.ljust(_NPY_HEADER - 10 - 1) + '\n'
+
+        self.file.seek(0)
+        self.file.write(b'\x93NUMPY\x01\x00')
+        self.file.write(len(header).to_bytes(2, 'little'))
+        self.file.write(header.encode('latin1'))
+
+    def append(self, values, count):
+        self.file.seek(_NPY_HEADER + 8 * self.length)
+        self.file.write(memoryview(values)[:count])
+        self.length += count
+        self._write_header()
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_npy_length(path):
+    """Return the number of values in a column written by TurnStats."""
+    with open(path, 'rb') as npy:
+        header = npy.read(_NPY_HEADER)[10:].decode('latin1')
+    return ast.literal_eval(header)['shape'][0]
+
+
+def _create_part(directory):
+    """Create the next free part-<n>.parquet file in the directory."""
+    os.makedirs(directory, exist_ok=True)
+    index = len(os.listdir(directory))
+    while True:
+        try:
+            return open(os.path.join(directory,
+                                     'part-%05d.parquet' % index), 'xb')
+        except FileExistsError:
+            index += 1
+
+
+class TurnStats(object):
+    """
+    Collects statistics of every player at the end of every turn.
+
+    Rows are appended to preallocated int64 column buffers and written in
+    bulk once the buffers are full, to the directory at path. If pyarrow
+    is available, every TurnStats writes a new Parquet file in it,
+    otherwise there is one .npy file per column, which is appended to.
+    Either way rows of earlier runs are kept. Both can be loaded
+    column-wise without parsing, e.g. with pyarrow.parquet.read_table on
+    the directory or numpy.load(mmap_mode='r').
+
+    A single TurnStats may be shared by all games of a server, rows are
+    told apart by the game column. It holds Logic.game_key, which the
+    ResultStore stores in the game_key column of its games table.
+
+    Public Methods:
+    append, flush, close
+    """
+
+    CAPACITY = 65536
+
+    def __init__(self, path, capacity=CAPACITY, use_parquet=True):
+        self.path = path
+        self.capacity = capacity
+        self.size = 0
+        self.buffers = [array('q', bytes(8 * capacity)) for _ in COLUMNS]
+
+        if use_parquet and pa is not None:
+            self.format = 'parquet'
+            schema = pa.schema([(name, pa.int64()) for name in COLUMNS])
+            # ParquetWriter cannot append, write a file per run instead
+            self.file = _create_part(path)
+            self.writer = pq.ParquetWriter(self.file, schema)
+        else:
+            self.format = 'npy'
+            os.makedirs(path, exist_ok=True)
+            self.writer = [
+                _NpyColumn(os.path.join(path, name + '.npy'))
+                for name in COLUMNS
+            ]
+            # a crash may have left some columns longer than others
+            length = min(column.length for column in self.writer)
+            for column in self.writer:
+                if column.length != length:
+                    column.truncate(length)
+
+    def append(self, game, turn, player, troops, territories,
+               attacks, attacks_won, cards_traded):
+        """Append a single row, the order of arguments matches COLUMNS."""
+        i = self.size
+        buffers = self.buffers
+
+        buffers[0][i] = game
+        buffers[1][i] = turn
+        buffers[2][i] = player
+        buffers[3][i] = troops
+        buffers[4][i] = territories
+        buffers[5][i] = attacks
+        buffers[6][i] = attacks_won
+        buffers[7][i] = cards_traded
+
+        self.size = i + 1
+        if self.size == self.capacity:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows."""
+        if self.size == 0:
+            return
+
+        if self.format == 'parquet':
+            arrays = [
+                pa.Array.from_buffers(
+                    pa.int64(), self.size, [None, pa.py_buffer(buffer)]
+                )
+                for buffer in self.buffers
+            ]
+            # from_buffers does not copy, write before buffers are reused
+            table = pa.Table.from_arrays(arrays, list(COLUMNS))
+            self.writer.write_table(table)
+        else:
+            for column, buffer in zip(self.writer, self.buffers):
+                column.append(buffer, self.size)
+
+        self.size = 0
+
+    def close(self):
+        """Write all buffered rows and close the files."""
+        self.flush()
+
+        if self.format == 'parquet':
+            self.writer.close()
+            self.file.close()
+        else:
+            for column in self.writer:
+                column.close()
@@ -0,0 +1,310 @@
+"""
+Soak test for the server.
+
+Runs the Controller with its network server for a long time. Bots play
+games back to back while simulated clients connect, send a few requests
+and disconnect again, leaving their seats to bots. At every report,
+memory is measured with tracemalloc and RSS against a baseline taken
+after the warmup games. The retained memory is attributed to the
+subsystems, i.e. modules, that allocated it, and every finished game is
+checked to be garbage.
+
+The test fails if the memory per completed game does not return to the
+baseline or if finished games are still alive.
+
+Usage: python -m test.soak --duration 3600
+"""
+import argparse
+import asyncio as aio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import weakref
+
+from risk.controller import Controller
+
+
+def rss():
+    """Resident set size of this process in bytes, None if unknown."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def subsystem(filename):
+    """Name of the subsystem a source file belongs to."""
+    parts = filename.replace('\\', '/').split('/')
+    for package in ('risk', 'statemachine', 'transitions', 'asyncio'):
+        if package in parts[:-1]:
+            name = parts[-1].rsplit('.', 1)[0]
+            return name if package == 'risk' else package
+
+    return 'other'
+
+
+class SoakController(Controller):
+    """Controller that keeps track of the games it started and finished."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.running = set()
+        self.completed = 0
+        # finished games by id, they must not stay alive
+        self.finished = weakref.WeakValueDictionary()
+
+    def start_game(self, players):
+        super().start_game(players)
+        self.running.add(self.games[players[0]].game_id)
+
+    def finish_game(self, logic):
+        super().finish_game(logic)
+        self.running.discard(logic.game_id)
+        self.finished[logic.game_id] = logic
+        self.completed += 1
+
+
+class Report(object):
+    """Memory in use after a number of completed games."""
+
+    def __init__(self, completed, snapshot, rss_bytes):
+        self.completed = completed
+        self.snapshot = snapshot
+        self.traced = sum(s.size for s in snapshot.statistics('filename'))
+        self.rss = rss_bytes
+
+    def per_game(self, baseline):
+        """Traced bytes retained per game completed since the baseline."""
+        games = self.completed - baseline.completed
+        if games <= 0:
+            return 0
+        return (self.traced - baseline.traced) / games
+
+    def by_subsystem(self, baseline):
+        """Traced bytes retained since the baseline by subsystem."""
+        retained = defaultdict(int)
+        for stat in self.snapshot.compare_to(baseline.snapshot, 'filename'):
+            filename = stat.traceback[0].filename
+            retained[subsystem(filename)] += stat.size_diff
+
+        return sorted(retained.items(), key=lambda item: -item[1])
+
+
+class SoakTest(object):
+    """
+    Play games for the given duration and check the memory afterwards.
+
+    Attributes:
+    duration, concurrency, warmup, tolerance, report_interval, clients,
+    processes, drain_timeout
+    """
+
+    DRAIN_TIMEOUT = 30
+
+    def __init__(self, duration, concurrency=8, warmup=50, tolerance=1024,
+                 report_interval=60, clients=4, processes=False,
+                 drain_timeout=DRAIN_TIMEOUT, out=sys.stdout):
+        self.duration = duration
+        # games played by bots at the same time
+        self.concurrency = concurrency
+        # completed games before the baseline is taken
+        self.warmup = warmup
+        # bytes per completed game that may be retained
+        self.tolerance = tolerance
+        self.report_interval = report_interval
+        # simulated network clients at the same time
+        self.clients = clients
+        # bots run in the Controller's own process pool instead of threads
+        self.processes = processes
+        # seconds running games and clients may take to end at the end
+        self.drain_timeout = drain_timeout
+        self.out = out
+
+        self.loop = None
+        self.controller = None
+        self.port = None
+        self.baseline = None
+        self.reports = []
+
+    def run(self):
+        """Run the soak test. Returns True if it passed."""
+        self.loop = aio.new_event_loop()
+        aio.set_event_loop(self.loop)
+        tracemalloc.start()
+
+        # the Controller creates its process pool if it gets no executor
+        executor = None if self.processes else ThreadPoolExecutor(2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.sqlite')
+            self.controller = SoakController(path, executor)
+            self.controller.server.run('localhost', 0)
+            self.port = self.controller.server.server.sockets[0] \
+                .getsockname()[1]
+
+            try:
+                return self.loop.run_until_complete(self._soak())
+            finally:
+                self.loop.run_until_complete(self.controller.server.close())
+                self.controller.results.close()
+                if self.controller.bot_executor is not None:
+                    self.controller.bot_executor.shutdown()
+                if executor is not None:
+                    executor.shutdown()
+                self.loop.close()
+                tracemalloc.stop()
+
+    async def _soak(self):
+        end = time.monotonic() + self.duration
+        next_report = time.monotonic() + self.report_interval
+        clients = set()
+
+        while time.monotonic() < end:
+            while len(self.controller.running) < self.concurrency:
+                bots = [self.controller.add_bot()
+                        for _ in range(Controller.PLAYERS_PER_GAME)]
+                self.controller.start_game(bots)
+
+            while len(clients) < self.clients:
+                clients.add(self.loop.create_task(self._client()))
+            clients = {c for c in clients if not c.done()}
+
+            if self.baseline is None:
+                if self.controller.completed >= self.warmup:
+                    self.baseline = self._measure()
+                    self._print_report(self.baseline)
+            elif time.monotonic() >= next_report:
+                self._print_report(self._measure())
+                next_report = time.monotonic() + self.report_interval
+
+            await aio.sleep(0.01)
+
+        # let running games and clients end before the final measurement
+        for client in clients:
+            client.cancel()
+        await aio.gather(*clients, return_exceptions=True)
+        drain_end = time.monotonic() + self.drain_timeout
+        while self.controller.running or self.controller.server.clients:
+            if time.monotonic() >= drain_end:
+                print('FAIL: %d games and %d clients did not end within %d '
+                      'seconds' % (len(self.controller.running),
+                                   len(self.controller.server.clients),
+                                   self.drain_timeout), file=self.out)
+                return False
+            await aio.sleep(0.01)
+
+        final = self._measure()
+        self._print_report(final)
+        return self._check(final)
+
+    async def _client(self):
+        """A client that sends some requests and leaves its seat to a bot."""
+        reader, writer = await aio.open_connection('localhost', self.port)
+        try:
+            for ident in range(random.randint(1, 5)):
+                request = {'type': 1, 'id': ident, 'data': {'ping': ident}}
+                writer.write((json.dumps(request) + '\n').encode('utf-8'))
+            await writer.drain()
+
+            await aio.sleep(random.uniform(0, 0.2))
+            await reader.readline()
+        finally:
+            writer.close()
+
+    def _measure(self):
+        self.controller.results.flush()
+        gc.collect()
+        return Report(self.controller.completed,
+                      tracemalloc.take_snapshot(), rss())
+
+    def _print_report(self, report):
+        line = 'games: %d, traced: %d KiB' % (report.completed,
+                                             report.traced // 1024)
+        if report.rss is not None:
+            line += ', rss: %d KiB' % (report.rss // 1024)
+
+        if report is not self.baseline:
+            line += ', per game: %.0f B' % report.per_game(self.baseline)
+            retained = report.by_subsystem(self.baseline)[:5]
+            line += ', by subsystem: ' + ', '.join(
+                '%s %+d B' % item for item in retained
+            )
+
+        print(line, file=self.out)
+        self.reports.append((report.completed, report.traced, report.rss))
+
+    def _check(self, final):
+        passed = True
+
+        if self.baseline is None:
+            print('FAIL: fewer than %d games completed' % self.warmup,
+                  file=self.out)
+            return False
+
+        per_game = final.per_game(self.baseline)
+        if per_game > self.tolerance:
+            print('FAIL: %.0f bytes retained per game, allowed %d'
+                  % (per_game, self.tolerance), file=self.out)
+            passed = False
+
+        alive = list(self.controller.finished.keys())
+        if alive:
+            print('FAIL: %d finished games still alive, e.g. %s'
+                  % (len(alive), alive[0]), file=self.out)
+            passed = False
+
+        for name, state in [('games', self.controller.games),
+                            ('bots', self.controller.bots),
+                            ('thinking', self.controller.thinking),
+                            ('queue', self.controller.matchmaker),
+                            ('clients', self.controller.server.clients),
+                            ('inboxes', self.controller.server.inboxes)]:
+            if len(state):
+                print('FAIL: %d entries left in %s' % (len(state), name),
+                      file=self.out)
+                passed = False
+
+        if passed:
+            print('OK', file=self.out)
+        return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--duration', type=float, default=3600,
+                        help='seconds to run')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='bot games at the same time')
+    parser.add_argument('--warmup', type=int, default=50,
+                        help='games before the baseline is taken')
+    parser.add_argument('--tolerance', type=int, default=1024,
+                        help='retained bytes allowed per game')
+    parser.add_argument('--report-interval', type=float, default=60,
+                        help='seconds between two reports')
+    parser.add_argument('--clients', type=int, default=4,
+                        help='simulated network clients at the same time')
+    parser.add_argument('--processes', action='store_true',
+                        help='run bots in the default process pool')
+    parser.add_argument('--drain-timeout', type=float,
+                        default=SoakTest.DRAIN_TIMEOUT,
+                        help='seconds games may take to end at the end')
+    args = parser.parse_args()
+
+    soak = SoakTest(args.duration, args.concurrency, args.warmup,
+                    args.tolerance, args.report_interval, args.clients,
+                    args.processes, args.drain_timeout)
+    sys.exit(0 if soak.run() else 1)
+
+
+if __name__ == '__main__':
+    main()
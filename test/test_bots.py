@@ -0,0 +1,64 @@
+import time
+from unittest import TestCase
+
+import risk.board
+import risk.bots
+import risk.logic
+from risk.messages import Message
+
+
+class TestBots(TestCase):
+    """Test the built-in bots."""
+
+    def setUp(self):
+        self.board = risk.board.Board()
+        self.logic = risk.logic.Logic(self.board, ['bot', 'other'], 1)
+        self.logic.start()
+
+    def test_view(self):
+        view = risk.bots.view_for(self.logic, 'bot')
+
+        self.assertEqual(view.player, 'bot')
+        self.assertEqual(view.available_troops, 3)
+        self.assertEqual(len(view.countries), len(self.board.countries))
+        self.assertEqual(set(view.neighbours['Thailand']), {'Germany'})
+
+    def test_fallback_action(self):
+        bot = risk.bots.Bot()
+        view = risk.bots.view_for(self.logic, 'bot')
+
+        action = bot.fallback_action(view)
+        self.assertEqual(action['type'], Message.Type.Deploy.value)
+        self.assertEqual(action['data']['troops'], 3)
+
+        action = bot.fallback_action(view._replace(available_troops=0))
+        self.assertEqual(action['type'], Message.Type.Finished.value)
+
+        # troops left, but deploying is not allowed anymore after moving
+        action = bot.fallback_action(view._replace(state='moved'))
+        self.assertEqual(action['type'], Message.Type.Finished.value)
+
+    def test_random_bot_deploys_first(self):
+        bot = risk.bots.RandomBot()
+        view = risk.bots.view_for(self.logic, 'bot')
+
+        action = bot.next_action(view, time.monotonic() + 1)
+        self.assertEqual(action['type'], Message.Type.Deploy.value)
+        self.assertTrue(self.logic.is_ingame('bot'))
+        self.assertEqual(
+            self.board.country_for_name(action['data']['country']).owner,
+            self.logic.players[0]
+        )
+
+    def test_random_bot_is_reproducible(self):
+        replay = risk.logic.Logic(risk.board.Board(), ['bot', 'other'],
+                                  self.logic.rng.seed,
+                                  backend=self.logic.rng.backend)
+        replay.start()
+        bot = risk.bots.RandomBot()
+        deadline = time.monotonic() + 1
+
+        view = risk.bots.view_for(self.logic, 'bot')
+        self.assertEqual(view, risk.bots.view_for(replay, 'bot'))
+        self.assertEqual(bot.next_action(view, deadline),
+                         bot.next_action(view, deadline))
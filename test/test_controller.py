@@ -0,0 +1,353 @@
+import asyncio as aio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import tempfile
+import time
+from unittest import TestCase, mock
+
+from risk import bots
+from risk.controller import Controller
+from risk.logic import Card
+
+
+class SlowBot(bots.Bot):
+    """Bot that ignores its deadline."""
+
+    def next_action(self, view, deadline):
+        time.sleep(0.2)
+        return bots.finish()
+
+
+class TestController(TestCase):
+    """Test the Controller without network connections."""
+
+    def setUp(self):
+        self.loop = aio.new_event_loop()
+        aio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        path = os.path.join(directory.name, 'results.sqlite')
+        self.controller = Controller(path)
+        self.addCleanup(self.controller.results.close)
+
+    def connect(self, player):
+        self.loop.run_until_complete(self.controller.player_connected(player))
+
+    def disconnect(self, player, reason='disconnected'):
+        self.loop.run_until_complete(
+            self.controller.player_disconnected(player, reason)
+        )
+
+    def test_matching(self):
+        players = ['p%d' % i for i in range(Controller.PLAYERS_PER_GAME + 1)]
+        for player in players:
+            self.connect(player)
+
+        in_game = [p for p in players if p in self.controller.games]
+        self.assertEqual(in_game, players[:Controller.PLAYERS_PER_GAME])
+        self.assertEqual(len(self.controller.matchmaker), 1)
+        self.assertIn(players[-1], self.controller.matchmaker)
+
+    def test_disconnect(self):
+        players = ['p%d' % i for i in range(Controller.PLAYERS_PER_GAME)]
+        for player in players:
+            self.connect(player)
+
+        self.disconnect(players[0])
+        self.assertNotIn(players[0], self.controller.games)
+
+        self.connect('late')
+        self.disconnect('late')
+        self.assertEqual(len(self.controller.matchmaker), 0)
+
+    def send(self, player, line):
+        """Process a line as if the player sent it."""
+        payload = self.controller.decode(player, line)
+        self.loop.run_until_complete(self.controller.message(player, payload))
+
+    def run_until(self, condition, timeout=10):
+        async def wait():
+            while not condition():
+                await aio.sleep(0.001)
+
+        self.loop.run_until_complete(aio.wait_for(wait(), timeout))
+
+    def test_bot_game(self):
+        self.controller.bot_executor = ThreadPoolExecutor(1)
+        self.addCleanup(self.controller.bot_executor.shutdown)
+
+        bots = [self.controller.add_bot()
+                for _ in range(Controller.PLAYERS_PER_GAME)]
+        self.controller.start_game(bots)
+
+        # the game ends once a bot owns the board, then bots are dropped
+        self.run_until(lambda: not self.controller.games)
+        self.assertEqual(self.controller.bots, {})
+
+        # bots are counted under the name of their class
+        self.controller.results.flush()
+        leaderboard = self.controller.results.leaderboard()
+        self.assertEqual([row[:2] for row in leaderboard],
+                         [('bot:RandomBot', Controller.PLAYERS_PER_GAME)])
+
+    def test_bot_takes_over_seat(self):
+        self.controller.bot_executor = ThreadPoolExecutor(1)
+        self.addCleanup(self.controller.bot_executor.shutdown)
+
+        players = ['p%d' % i for i in range(Controller.PLAYERS_PER_GAME)]
+        for player in players:
+            self.connect(player)
+        logic = self.controller.games[players[0]]
+        current = logic.current_player.ident
+
+        self.disconnect(current)
+
+        self.assertFalse(logic.is_ingame(current))
+        self.assertEqual(len(self.controller.bots), 1)
+        bot = next(iter(self.controller.bots))
+        self.assertIs(self.controller.games[bot], logic)
+
+        # the bot plays the turn of the lost player
+        self.run_until(lambda: not logic.is_current(bot)
+                       or logic.is_finished())
+
+    def test_bot_takes_over_mid_turn(self):
+        self.controller.bot_executor = ThreadPoolExecutor(1)
+        self.addCleanup(self.controller.bot_executor.shutdown)
+
+        players = ['p%d' % i for i in range(Controller.PLAYERS_PER_GAME)]
+        for player in players:
+            self.connect(player)
+        logic = self.controller.games[players[0]]
+        current = logic.current_player
+        origin = next(c for c in logic.board.countries_list()
+                      if c.owner == current)
+        destination = next(c for c in logic.board.countries_list()
+                           if c.owner != current)
+
+        # give the player a second country to move troops to
+        destination.owner.owned_countries -= 1
+        destination.owner = current
+        current.owned_countries += 1
+
+        # deploy only some troops, then move, so troops are left over
+        origin.troops = 3
+        for payload in [
+                {'type': 2, 'data': {'country': origin.name, 'troops': 1}},
+                {'type': 7, 'data': {'origin': origin.name,
+                                     'destination': destination.name,
+                                     'troops': 1}}]:
+            self.send(current.ident, json.dumps(payload))
+        self.assertEqual(logic.state, 'moved')
+        self.assertGreater(current.available_troops, 0)
+
+        self.disconnect(current.ident)
+
+        # the bot ends the turn instead of getting stuck
+        self.run_until(lambda: logic.current_player is not current)
+
+    @mock.patch.object(Controller, 'BOT_MOVE_TIME', 0.01)
+    def test_slow_bot_replaces_pool(self):
+        executor = ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        self.controller.bot_executor = executor
+        self.controller.owns_bot_executor = True
+        # only the move below is played
+        self.controller.schedule_bot = lambda logic: None
+
+        players = [self.controller.add_bot()
+                   for _ in range(Controller.PLAYERS_PER_GAME)]
+        self.controller.start_game(players)
+        logic = self.controller.games[players[0]]
+        ident = logic.current_player.ident
+        self.controller.bots[ident] = SlowBot()
+
+        self.loop.run_until_complete(self.controller.play_bot(logic, ident))
+
+        # the fallback was played and the busy pool is not used anymore
+        self.assertEqual(logic.state, 'deploying')
+        self.assertIsNone(self.controller.bot_executor)
+
+    @mock.patch.object(Controller, 'BOT_MOVE_TIME', 0.05)
+    def test_slow_bot_does_not_stall_other_games(self):
+        executors = []
+
+        def new_bot_executor():
+            executor = ThreadPoolExecutor(1)
+            executors.append(executor)
+            self.addCleanup(executor.shutdown)
+            return executor
+
+        self.controller.new_bot_executor = new_bot_executor
+        self.controller.owns_bot_executor = True
+
+        slow_game = [self.controller.add_bot()
+                     for _ in range(Controller.PLAYERS_PER_GAME)]
+        for ident in slow_game:
+            self.controller.bots[ident] = SlowBot()
+        self.controller.start_game(slow_game)
+
+        other_game = [self.controller.add_bot()
+                      for _ in range(Controller.PLAYERS_PER_GAME)]
+        self.controller.start_game(other_game)
+        logic = self.controller.games[other_game[0]]
+
+        # the other game's first move waits behind the slow one in the
+        # same worker, it must go on once the pool is replaced
+        self.run_until(lambda: logic.turns >= 3 or logic.is_finished())
+        self.assertGreater(len(executors), 1)
+
+        # stop both games, bots that were thinking are not anymore
+        tasks = aio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(
+            aio.gather(*tasks, return_exceptions=True)
+        )
+        self.assertEqual(self.controller.thinking, set())
+
+    def test_bot_cancelled_before_it_started(self):
+        bots = [self.controller.add_bot()
+                for _ in range(Controller.PLAYERS_PER_GAME)]
+        self.controller.start_game(bots)
+        self.assertEqual(len(self.controller.thinking), 1)
+
+        # play_bot never runs
+        tasks = aio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(
+            aio.gather(*tasks, return_exceptions=True)
+        )
+        self.assertEqual(self.controller.thinking, set())
+
+    def record_sent(self):
+        sent = []
+        self.controller.server.send_message = \
+            lambda player, message: sent.append((player, message.json()))
+        return sent
+
+    def test_garbage_from_current_player(self):
+        self.controller.bot_executor = ThreadPoolExecutor(1)
+        self.addCleanup(self.controller.bot_executor.shutdown)
+        sent = self.record_sent()
+        kicked = []
+        self.controller.server.kick_client = \
+            lambda player, reason: kicked.append((player, reason))
+
+        players = ['p%d' % i for i in range(Controller.PLAYERS_PER_GAME)]
+        for player in players:
+            self.connect(player)
+        logic = self.controller.games[players[0]]
+        current = logic.current_player
+        ident = current.ident
+
+        for payload in ['{"id": 7, "type": "nonsense"}', 'not json']:
+            self.send(ident, payload)
+
+        self.assertEqual(kicked, [(ident, 'invalid message')] * 2)
+        self.assertEqual([m for _, m in sent], [
+            {'id': 7, 'success': False, 'error': 'Invalid message.'},
+            {'success': False, 'error': 'Invalid message.'},
+        ])
+
+        # the server closes the connection, then a bot plays on
+        self.disconnect(ident, 'invalid message')
+        self.assertNotIn(ident, self.controller.games)
+        self.controller.results.flush()
+        self.assertEqual(self.controller.results._query(
+            'SELECT player, reason FROM kicks', ()
+        ), [(ident, 'invalid message')])
+        self.run_until(lambda: logic.current_player is not current)
+
+    def test_pipelined_answers(self):
+        sent = self.record_sent()
+        players = ['p%d' % i for i in range(Controller.PLAYERS_PER_GAME)]
+        for player in players:
+            self.connect(player)
+
+        logic = self.controller.games[players[0]]
+        current = logic.current_player.ident
+        waiting = next(p for p in players if p != current)
+        country = next(c.name for c in logic.board.countries_list()
+                       if c.owner.ident == current)
+
+        requests = [
+            (waiting, {'type': 2, 'id': 1,
+                       'data': {'country': country, 'troops': 1}}),
+            (current, {'type': 2, 'id': 2,
+                       'data': {'country': 'Atlantis', 'troops': 1}}),
+            (current, {'type': 2, 'id': 3,
+                       'data': {'country': country, 'troops': 100}}),
+            (current, {'type': 2, 'id': 4,
+                       'data': {'country': country, 'troops': 3}}),
+            (current, {'type': 13, 'id': 5, 'data': {}}),
+        ]
+        for player, payload in requests:
+            self.send(player, json.dumps(payload))
+
+        answers = [(p, m['id'], m['success']) for p, m in sent]
+        self.assertEqual(answers, [
+            (waiting, 1, False), (current, 2, False), (current, 3, False),
+            (current, 4, True), (current, 5, True)
+        ])
+        self.assertEqual(sent[0][1]['error'], 'Not the player\'s turn.')
+
+        # rejected players stay in their game
+        self.assertIn(waiting, self.controller.games)
+        self.assertFalse(logic.is_current(current))
+
+    def test_invalid_numbers(self):
+        sent = self.record_sent()
+        players = ['p%d' % i for i in range(Controller.PLAYERS_PER_GAME)]
+        for player in players:
+            self.connect(player)
+
+        logic = self.controller.games[players[0]]
+        current = logic.current_player
+        country = next(c for c in logic.board.countries_list()
+                       if c.owner == current)
+        available, troops = current.available_troops, country.troops
+
+        for value in [-50, 0, 1.5, True, '3']:
+            payload = {'type': 2, 'data': {'country': country.name,
+                                           'troops': value}}
+            self.send(current.ident, json.dumps(payload))
+
+        self.assertEqual([m['error'] for _, m in sent],
+                         ['Invalid message data.'] * 5)
+        self.assertEqual(current.available_troops, available)
+        self.assertEqual(country.troops, troops)
+
+    def test_bonus(self):
+        sent = self.record_sent()
+        players = ['p%d' % i for i in range(Controller.PLAYERS_PER_GAME)]
+        for player in players:
+            self.connect(player)
+
+        logic = self.controller.games[players[0]]
+        current = logic.current_player
+        available = current.available_troops
+
+        for ident, bonus in [(1, 'JOKER'), (2, 'MIXED')]:
+            self.send(current.ident, json.dumps(
+                {'type': 9, 'id': ident, 'data': {'bonus': bonus}}
+            ))
+
+        current.cards = [Card.INFANTRY, Card.CAVALRY, Card.ARTILLERY]
+        self.send(current.ident, json.dumps(
+            {'type': 9, 'id': 3, 'data': {'bonus': 'MIXED'}}
+        ))
+
+        self.assertEqual([(m['id'], m['success'], m.get('error'))
+                          for _, m in sent], [
+            (1, False, 'Invalid message data.'),
+            (2, False, 'Preconditions for state change not fulfilled.'),
+            (3, True, None),
+        ])
+        self.assertEqual(current.available_troops, available + 10)
+        self.assertEqual(current.cards, [])
@@ -2,6 +2,7 @@ from unittest import TestCase, skip
 
 import risk.logic
 import risk.board
+import risk.messages
 
 
 class TestLogic(TestCase):
@@ -31,3 +32,109 @@ class TestLogic(TestCase):
         for country in self.board.countries_list():
             with self.subTest(country=country):
                 self.assertNotEqual(country.owner, self.p1)
+
+    def test_standings(self):
+        country = self.board.countries_list()[0]
+        loser = country.owner
+        winner = self.logic.players[0]
+        if winner == loser:
+            winner = self.logic.players[1]
+
+        country.owner = winner
+        loser.owned_countries -= 1
+        winner.owned_countries += 1
+
+        self.assertEqual(self.logic.standings()[0], winner)
+        self.assertFalse(self.logic.is_finished())
+
+    def test_standings_of_eliminated_players(self):
+        logic = risk.logic.Logic(risk.board.Board(),
+                                 [self.p1, self.p2, self.p3], 1)
+        first, second, third = logic.players
+        for player in logic.players:
+            player.owned_countries = 0
+        first.owned_countries = 4
+        third.eliminated_in_turn = 2
+        second.eliminated_in_turn = 5
+
+        self.assertEqual(logic.standings(), [first, second, third])
+
+    def test_attack_eliminates_player(self):
+        logic = risk.logic.Logic(self.board, [self.p1, self.p2], 1)
+        logic.start()
+        attacker = logic.current_player
+        defender = next(p for p in logic.players if p != attacker)
+
+        origin, destination = self.board.countries_list()[:2]
+        for country in self.board.countries_list():
+            country.owner = attacker
+        origin.troops = 4
+        destination.owner = defender
+        destination.troops = 1
+        attacker.owned_countries = 3
+        defender.owned_countries = 1
+
+        # attacker wins every roll
+        logic.rng.roll_dice = lambda n: [6] * n if n == 3 else [1] * n
+
+        logic.deploy(risk.messages.Deploy({'country': origin.name,
+                                           'troops': 3}))
+        logic.attack(risk.messages.Attack({
+            'origin': origin.name, 'destination': destination.name,
+            'attack_troops': 3
+        }))
+
+        self.assertEqual(defender.eliminated_in_turn, logic.turns)
+        self.assertIsNone(attacker.eliminated_in_turn)
+        self.assertEqual(logic.standings(), [attacker, defender])
+
+    def test_is_finished(self):
+        winner = self.logic.players[0]
+        for country in self.board.countries_list():
+            country.owner.owned_countries -= 1
+            country.owner = winner
+            winner.owned_countries += 1
+
+        self.assertTrue(self.logic.is_finished())
+        self.assertEqual(self.logic.standings()[0], winner)
+
+    def test_seed_reproduces_distribution(self):
+        logic = risk.logic.Logic(risk.board.Board(), [self.p1, self.p2], 42)
+        owners = [c.owner for c in logic.board.countries_list()]
+
+        replay = risk.logic.Logic(risk.board.Board(), [self.p1, self.p2], 42)
+        replay_owners = [c.owner for c in replay.board.countries_list()]
+
+        self.assertEqual(logic.rng.seed, 42)
+        self.assertEqual(owners, replay_owners)
+
+    def test_backend_reproduces_dice(self):
+        logic = risk.logic.Logic(risk.board.Board(), [self.p1, self.p2], 42,
+                                 backend='python')
+        replay = risk.logic.Logic(risk.board.Board(), [self.p1, self.p2],
+                                  logic.rng.seed, backend=logic.rng.backend)
+
+        self.assertEqual([logic.rng.roll_dice(3) for _ in range(10)],
+                         [replay.rng.roll_dice(3) for _ in range(10)])
+
+    def test_turns(self):
+        self.logic.start()
+        self.assertTrue(self.logic.is_current(self.p1))
+        self.assertEqual(self.logic.players[0].available_troops, 3)
+
+        player = self.logic.current_player
+        country = next(c for c in self.board.countries_list()
+                       if c.owner == player)
+        deploy = risk.messages.Deploy({'country': country.name, 'troops': 3})
+        self.assertTrue(self.logic.deploy(deploy))
+        self.assertEqual(country.troops, 4)
+
+        self.assertTrue(self.logic.next_turn(None))
+        self.assertTrue(self.logic.is_current(self.p2))
+        self.assertEqual(self.logic.turns, 2)
+
+    def test_replace_player(self):
+        self.logic.replace_player(self.p1, self.p3)
+
+        self.assertFalse(self.logic.is_ingame(self.p1))
+        self.assertTrue(self.logic.is_ingame(self.p3))
@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+from risk.matchmaking import Matchmaker
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMatchmaker(TestCase):
+    """Test the Matchmaker."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.matchmaker = Matchmaker(2, bucket_width=100, base_gap=100,
+                                     gap_growth=10, clock=self.clock)
+
+    def test_match_similar_ratings(self):
+        self.matchmaker.enqueue('a', 1500)
+        self.assertIsNone(self.matchmaker.match('a'))
+
+        self.matchmaker.enqueue('b', 1550)
+        self.assertEqual(self.matchmaker.match('b'), ['b', 'a'])
+        self.assertEqual(len(self.matchmaker), 0)
+
+    def test_more_players_than_needed(self):
+        for player in 'abcde':
+            self.matchmaker.enqueue(player, 1500)
+
+        self.assertEqual(self.matchmaker.match('e'), ['e', 'a'])
+        self.assertEqual(self.matchmaker.match('d'), ['d', 'b'])
+        self.assertIsNone(self.matchmaker.match('c'))
+        self.assertIn('c', self.matchmaker)
+
+    def test_prefers_nearest_bucket(self):
+        self.matchmaker.enqueue('far', 1380)
+        self.matchmaker.enqueue('near', 1550)
+        self.matchmaker.enqueue('new', 1510)
+
+        self.assertEqual(self.matchmaker.match('new'), ['new', 'near'])
+
+    def test_gap_checked_per_player(self):
+        # the buckets 14 and 15 are within the gap, the players are not
+        self.matchmaker.enqueue('low', 1400)
+        self.matchmaker.enqueue('high', 1599)
+        self.assertIsNone(self.matchmaker.match('low'))
+
+        self.matchmaker.enqueue('near', 1499)
+        self.assertEqual(self.matchmaker.match('low'), ['low', 'near'])
+
+    def test_gap_widens_over_time(self):
+        self.matchmaker.enqueue('a', 1000)
+        self.matchmaker.enqueue('b', 1500)
+
+        self.assertEqual(self.matchmaker.match_waiting(), [])
+
+        self.clock.now = 50
+        self.assertEqual(self.matchmaker.match_waiting(), [['a', 'b']])
+
+    def test_match_waiting_forms_several_games(self):
+        for player, rating in [('a', 1000), ('b', 1010),
+                               ('c', 2000), ('d', 2010), ('e', 3000)]:
+            self.matchmaker.enqueue(player, rating)
+
+        games = self.matchmaker.match_waiting()
+
+        self.assertEqual(sorted(map(sorted, games)),
+                         [['a', 'b'], ['c', 'd']])
+        self.assertEqual(len(self.matchmaker), 1)
+
+    def test_remove(self):
+        self.matchmaker.enqueue('a', 1500)
+        self.matchmaker.enqueue('b', 1500)
+        self.matchmaker.remove('a')
+        self.matchmaker.remove('unknown')
+
+        self.assertNotIn('a', self.matchmaker)
+        self.assertIsNone(self.matchmaker.match('b'))
+        self.assertEqual(self.matchmaker.bucket_keys, [15])
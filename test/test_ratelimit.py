@@ -0,0 +1,77 @@
+from unittest import TestCase
+
+from risk.ratelimit import (Limit, Policy, RateLimiter, RateLimitExceeded,
+                            TokenBucket)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(TestCase):
+    """Test the TokenBucket."""
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=1, burst=3, now=0)
+
+        for _ in range(3):
+            self.assertEqual(bucket.consume(0), 0)
+
+        self.assertAlmostEqual(bucket.consume(0), 1)
+
+    def test_refill(self):
+        bucket = TokenBucket(rate=2, burst=2, now=0)
+        bucket.consume(0)
+        bucket.consume(0)
+
+        self.assertAlmostEqual(bucket.consume(0.25), 0.25)
+        self.assertEqual(bucket.consume(0.5), 0)
+
+    def test_capacity(self):
+        bucket = TokenBucket(rate=10, burst=2, now=0)
+
+        for _ in range(2):
+            self.assertEqual(bucket.consume(100), 0)
+
+        self.assertGreater(bucket.consume(100), 0)
+
+
+class TestRateLimiter(TestCase):
+    """Test the RateLimiter."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(
+            {'slow': Limit(rate=1, burst=1, policy=Policy.DELAY)},
+            Limit(rate=1, burst=1, policy=Policy.KICK),
+            self.clock
+        )
+
+    def test_delay(self):
+        self.assertEqual(self.limiter.acquire('a', 'slow'), 0)
+        self.assertAlmostEqual(self.limiter.acquire('a', 'slow'), 1)
+
+        self.clock.now = 1
+        self.assertEqual(self.limiter.acquire('a', 'slow'), 0)
+
+    def test_kick(self):
+        self.limiter.acquire('a', None)
+
+        with self.assertRaises(RateLimitExceeded):
+            self.limiter.acquire('a', None)
+
+    def test_clients_independent(self):
+        self.limiter.acquire('a', 'slow')
+
+        self.assertEqual(self.limiter.acquire('b', 'slow'), 0)
+        self.assertEqual(self.limiter.acquire('a', None), 0)
+
+    def test_remove_client(self):
+        self.limiter.acquire('a', 'slow')
+        self.limiter.remove_client('a')
+
+        self.assertEqual(self.limiter.acquire('a', 'slow'), 0)
@@ -0,0 +1,110 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from risk.results import GameResult, Placement, ResultStore
+
+
+def make_result(game_id, players, finished):
+    placements = [Placement(player, place, 4 - place, 1, 2, 3, 0, 0)
+                  for place, player in enumerate(players, 1)]
+    return GameResult(game_id, int(game_id[1:]), 42, 'python',
+                      finished - 10, finished, 7, placements)
+
+
+class TestResultStore(TestCase):
+    """Test the ResultStore."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        path = os.path.join(directory.name, 'results.sqlite')
+        self.store = ResultStore(path, batch_delay=0.01)
+        self.addCleanup(self.store.close)
+
+    def test_leaderboard(self):
+        self.store.record_game(make_result('g1', ['a', 'b', 'c'], 100))
+        self.store.record_game(make_result('g2', ['b', 'a', 'c'], 200))
+        self.store.record_game(make_result('g3', ['b', 'c', 'a'], 300))
+        self.store.flush()
+
+        board = self.store.leaderboard(2)
+
+        self.assertEqual([row[:3] for row in board],
+                         [('b', 3, 2), ('a', 3, 1)])
+        self.assertAlmostEqual(board[0][3], 4 / 3)
+
+    def test_history(self):
+        self.store.record_game(make_result('g1', ['a', 'b'], 100))
+        self.store.record_game(make_result('g2', ['b', 'a'], 200))
+        self.store.flush()
+
+        self.assertEqual(self.store.history('a'),
+                         [('g2', 200, 2, 2), ('g1', 100, 1, 3)])
+        self.assertEqual(self.store.history('a', limit=1),
+                         [('g2', 200, 2, 2)])
+
+    def test_game_recorded_once(self):
+        result = make_result('g1', ['a', 'b'], 100)
+        self.store.record_game(result)
+        self.store.record_game(result)
+        self.store.flush()
+
+        self.assertEqual(self.store.leaderboard(), [
+            ('a', 1, 1, 1.0), ('b', 1, 0, 2.0)
+        ])
+
+    def test_close_commits_pending_writes(self):
+        self.store.record_kick('g1', 'a', 'disconnected')
+        self.store.record_game(make_result('g1', ['b', 'a'], 100))
+        self.store.close()
+
+        self.assertEqual(len(self.store.history('b')), 1)
+        kicks = self.store._query('SELECT game_id, player, reason FROM kicks',
+                                  ())
+        self.assertEqual(kicks, [('g1', 'a', 'disconnected')])
+
+    def test_flush_after_close(self):
+        self.store.close()
+        # must not block forever
+        self.store.flush()
+
+        with self.assertRaises(RuntimeError):
+            self.store.record_kick('g1', 'a', 'disconnected')
+
+    def test_writer_survives_any_error(self):
+        # too large for an SQLite INTEGER, raises OverflowError
+        self.store.record_game(make_result('g1', ['a'], 100)
+                               ._replace(seed=2 ** 64))
+        self.store.flush()
+        self.store.record_game(make_result('g2', ['a'], 200))
+        self.store.flush()
+
+        self.assertTrue(self.store.writer.is_alive())
+        self.assertEqual([row[0] for row in self.store.history('a')], ['g2'])
+
+    def test_bad_write_keeps_batch(self):
+        store = ResultStore(self.store.path, batch_delay=1)
+        self.addCleanup(store.close)
+
+        store.record_game(make_result('g1', ['a', 'b'], 100))
+        # the same player twice violates the primary key of placements
+        store.record_game(make_result('g2', ['c', 'c'], 200))
+        store.record_game(make_result('g3', ['b', 'a'], 300))
+        store.flush()
+
+        self.assertEqual(len(store.history('a')), 2)
+        self.assertEqual(store.history('c'), [])
+
+    def test_bots_counted_per_class(self):
+        result = make_result('g1', ['bot-1', 'human', 'bot-2'], 100)
+        placements = [p._replace(bot='RandomBot') if p.player != 'human'
+                      else p for p in result.placements]
+        self.store.record_game(result._replace(placements=placements))
+        self.store.flush()
+
+        self.assertEqual(self.store.leaderboard(), [
+            ('bot:RandomBot', 2, 1, 2.0), ('human', 1, 0, 2.0)
+        ])
+        self.assertEqual(len(self.store.history('bot-2')), 1)
@@ -0,0 +1,58 @@
+from unittest import TestCase
+
+from risk.rng import GameRandom
+
+
+class TestGameRandom(TestCase):
+    """Test the GameRandom."""
+
+    def test_same_seed_same_stream(self):
+        first = GameRandom(1234, block_size=8)
+        second = GameRandom(1234, block_size=8)
+
+        for n in [3, 2, 1, 3, 3, 2]:
+            with self.subTest(n=n):
+                self.assertEqual(first.roll_dice(n), second.roll_dice(n))
+
+        self.assertEqual([first.choice('abc') for _ in range(20)],
+                         [second.choice('abc') for _ in range(20)])
+
+        items, other_items = list(range(10)), list(range(10))
+        first.shuffle(items)
+        second.shuffle(other_items)
+        self.assertEqual(items, other_items)
+
+    def test_random_seed(self):
+        self.assertNotEqual(GameRandom().seed, GameRandom().seed)
+        self.assertLess(GameRandom().seed, 2 ** GameRandom.SEED_BITS)
+
+    def test_roll_dice(self):
+        rng = GameRandom(7, block_size=4)
+
+        for _ in range(100):
+            dice = rng.roll_dice(3)
+            self.assertEqual(len(dice), 3)
+            self.assertEqual(dice, sorted(dice, reverse=True))
+            self.assertTrue(all(1 <= d <= 6 for d in dice))
+
+    def test_choice(self):
+        rng = GameRandom(7, block_size=4)
+        drawn = {rng.choice('abc') for _ in range(100)}
+
+        self.assertEqual(drawn, set('abc'))
+
+    def test_python_backend(self):
+        first = GameRandom(99, backend='python')
+        second = GameRandom(99, backend='python')
+
+        self.assertEqual(first.backend, 'python')
+        self.assertEqual(first.roll_dice(3), second.roll_dice(3))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            GameRandom(1, backend='dice')
+
+    def test_seed_range(self):
+        for seed in [-1, 2 ** GameRandom.SEED_BITS, 1.5]:
+            with self.subTest(seed=seed), self.assertRaises(ValueError):
+                GameRandom(seed)
@@ -0,0 +1,217 @@
+import asyncio as aio
+from unittest import TestCase
+
+from risk.ratelimit import Limit, Policy, RateLimiter
+from risk.server import Server
+
+
+class RecordingCallbacks(Server.Callbacks):
+    def __init__(self, groups=None):
+        self.groups = groups or {}
+        self.received = []
+
+    async def message(self, player, payload):
+        self.received.append((player, payload))
+
+    def client_group(self, player):
+        return self.groups.get(player)
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.buffered = 0
+        self.aborted = False
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+    def abort(self):
+        self.aborted = True
+
+
+class FakeWriter(object):
+    def __init__(self, reading=True):
+        self.closed = False
+        self.written = b''
+        self.reading = reading
+        self.transport = FakeTransport()
+
+    def write(self, data):
+        self.written += data
+        if not self.reading:
+            self.transport.buffered += len(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeMessage(object):
+    def __init__(self, ident):
+        self.ident = ident
+
+    def json(self):
+        return {'id': self.ident}
+
+
+class TestScheduling(TestCase):
+    """Test how the Server schedules queued messages."""
+
+    def setUp(self):
+        self.loop = aio.new_event_loop()
+        aio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+
+    def make_server(self, callbacks, **kwargs):
+        server = Server(callbacks, self.loop, **kwargs)
+        server.scheduler = self.loop.create_task(server._process_messages())
+        self.addCleanup(self.stop_scheduler, server)
+        return server
+
+    def stop_scheduler(self, server):
+        server.scheduler.cancel()
+        self.loop.run_until_complete(
+            aio.gather(server.scheduler, return_exceptions=True)
+        )
+
+    def run_briefly(self, seconds=0.01):
+        self.loop.run_until_complete(aio.sleep(seconds))
+
+    def test_round_robin_clients(self):
+        callbacks = RecordingCallbacks()
+        server = self.make_server(callbacks)
+        chatty = server.register_client(None, FakeWriter())
+        quiet = server.register_client(None, FakeWriter())
+
+        for i in range(3):
+            server.handle_message(chatty, str(i))
+        server.handle_message(quiet, 'q')
+        self.run_briefly()
+
+        self.assertEqual(callbacks.received, [
+            (chatty, '0'), (quiet, 'q'), (chatty, '1'), (chatty, '2')
+        ])
+
+    def test_round_robin_groups(self):
+        callbacks = RecordingCallbacks()
+        server = self.make_server(callbacks)
+        a1 = server.register_client(None, FakeWriter())
+        a2 = server.register_client(None, FakeWriter())
+        b = server.register_client(None, FakeWriter())
+        callbacks.groups = {a1: 'a', a2: 'a', b: 'b'}
+
+        server.handle_message(a1, 'a1')
+        server.handle_message(a2, 'a2')
+        server.handle_message(b, 'b1')
+        server.handle_message(b, 'b2')
+        self.run_briefly()
+
+        self.assertEqual([p for _, p in callbacks.received],
+                         ['a1', 'b1', 'a2', 'b2'])
+
+    def test_kick_on_pending_overflow(self):
+        callbacks = RecordingCallbacks()
+        server = self.make_server(callbacks, max_pending=2)
+        writer = FakeWriter()
+        client = server.register_client(None, writer)
+
+        for i in range(3):
+            server.handle_message(client, str(i))
+        self.run_briefly()
+
+        self.assertTrue(writer.closed)
+        self.assertEqual(callbacks.received, [])
+        self.assertEqual(server.kick_reasons[client],
+                         'too many pending messages')
+
+    def test_rate_limit_delays(self):
+        callbacks = RecordingCallbacks()
+        limiter = RateLimiter(
+            {}, Limit(rate=50, burst=1, policy=Policy.DELAY), self.loop.time
+        )
+        server = self.make_server(callbacks, rate_limiter=limiter)
+        chatty = server.register_client(None, FakeWriter())
+        quiet = server.register_client(None, FakeWriter())
+
+        server.handle_message(chatty, 'c1')
+        server.handle_message(chatty, 'c2')
+        server.handle_message(quiet, 'q')
+        self.run_briefly(0)
+        self.run_briefly(0)
+
+        self.assertEqual([p for _, p in callbacks.received], ['c1', 'q'])
+
+        self.run_briefly(0.1)
+        self.assertEqual([p for _, p in callbacks.received], ['c1', 'q', 'c2'])
+
+    def test_rate_limit_kicks(self):
+        callbacks = RecordingCallbacks()
+        limiter = RateLimiter(
+            {}, Limit(rate=1, burst=1, policy=Policy.KICK), self.loop.time
+        )
+        server = self.make_server(callbacks, rate_limiter=limiter)
+        writer = FakeWriter()
+        client = server.register_client(None, writer)
+
+        server.handle_message(client, '1')
+        server.handle_message(client, '2')
+        self.run_briefly()
+
+        self.assertTrue(writer.closed)
+        self.assertEqual(callbacks.received, [(client, '1')])
+        self.assertEqual(server.kick_reasons[client], 'rate limit exceeded')
+
+    def test_decode_once(self):
+        decoded = []
+
+        class DecodingCallbacks(RecordingCallbacks):
+            def decode(self, player, line):
+                decoded.append(line)
+                return int(line)
+
+            def classify(self, player, payload):
+                # called with the decoded payload
+                return type(payload)
+
+        callbacks = DecodingCallbacks()
+        limiter = RateLimiter(
+            {}, Limit(rate=50, burst=1, policy=Policy.DELAY), self.loop.time
+        )
+        server = self.make_server(callbacks, rate_limiter=limiter)
+        client = server.register_client(None, FakeWriter())
+
+        server.handle_message(client, '1')
+        server.handle_message(client, '2')
+        self.run_briefly(0.1)
+
+        self.assertEqual(decoded, ['1', '2'])
+        self.assertEqual(callbacks.received, [(client, 1), (client, 2)])
+
+    def test_send_in_order(self):
+        server = self.make_server(RecordingCallbacks())
+        writer = FakeWriter()
+        client = server.register_client(None, writer)
+
+        for i in range(3):
+            server.send_message(client, FakeMessage(i))
+        self.run_briefly()
+
+        self.assertEqual(writer.written.decode('utf-8').splitlines(),
+                         ['{"id": 0}', '{"id": 1}', '{"id": 2}'])
+        self.assertEqual(server.draining, set())
+
+    def test_kick_client_not_reading(self):
+        callbacks = RecordingCallbacks()
+        server = self.make_server(callbacks, max_write_buffer=25)
+        writer = FakeWriter(reading=False)
+        client = server.register_client(None, writer)
+
+        for i in range(3):
+            server.send_message(client, FakeMessage(i))
+        self.run_briefly()
+
+        self.assertTrue(writer.transport.aborted)
+        self.assertEqual(server.kick_reasons[client], 'not reading')
+        self.assertNotIn(client, server.inboxes)
@@ -0,0 +1,25 @@
+import io
+from unittest import TestCase
+
+from test.soak import SoakTest
+
+
+class TestSoak(TestCase):
+    """Run a short soak test, the long one is run by test/soak.py."""
+
+    def run_soak(self, **kwargs):
+        out = io.StringIO()
+        # a short run is too noisy for a tight per game tolerance
+        soak = SoakTest(duration=2, concurrency=4, warmup=10,
+                        tolerance=64 * 1024, report_interval=1,
+                        drain_timeout=10, out=out, **kwargs)
+
+        self.assertTrue(soak.run(), out.getvalue())
+        self.assertGreater(soak.reports[-1][0], soak.reports[0][0])
+
+    def test_no_state_left_behind(self):
+        self.run_soak()
+
+    def test_process_pool(self):
+        # the Controller's own pool, as used in production
+        self.run_soak(processes=True)
@@ -0,0 +1,187 @@
+from array import array
+import os
+import tempfile
+from unittest import TestCase, skipIf
+
+import risk.board
+import risk.logic
+import risk.messages
+from risk.results import GameResult
+from risk.stats import COLUMNS, TurnStats, _NpyColumn, read_npy_length
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+def read_column(directory, name):
+    with open(os.path.join(directory, name + '.npy'), 'rb') as npy:
+        npy.seek(128)
+        return list(array('q', npy.read()))
+
+
+class TestTurnStats(TestCase):
+    """Test the TurnStats."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def append_rows(self, stats, n):
+        for i in range(n):
+            stats.append(1, i, i % 2, 10 * i, 2, 3, 1, 0)
+
+    def test_npy(self):
+        path = os.path.join(self.directory, 'stats')
+        stats = TurnStats(path, capacity=4, use_parquet=False)
+        self.append_rows(stats, 10)
+
+        # two full buffers have been flushed
+        self.assertEqual(read_npy_length(os.path.join(path, 'turn.npy')), 8)
+
+        stats.close()
+
+        for name in COLUMNS:
+            with self.subTest(column=name):
+                length = read_npy_length(os.path.join(path, name + '.npy'))
+                self.assertEqual(length, 10)
+
+        self.assertEqual(read_column(path, 'turn'), list(range(10)))
+        self.assertEqual(read_column(path, 'troops'),
+                         [10 * i for i in range(10)])
+
+    def test_npy_reopen(self):
+        path = os.path.join(self.directory, 'stats')
+        stats = TurnStats(path, capacity=4, use_parquet=False)
+        self.append_rows(stats, 3)
+        stats.close()
+
+        # e.g. a restarted server appends to the rows of the last run
+        stats = TurnStats(path, capacity=4, use_parquet=False)
+        self.append_rows(stats, 2)
+        stats.close()
+
+        self.assertEqual(read_column(path, 'turn'), [0, 1, 2, 0, 1])
+
+    def test_npy_reopen_after_crash(self):
+        path = os.path.join(self.directory, 'stats')
+        stats = TurnStats(path, capacity=2, use_parquet=False)
+        self.append_rows(stats, 4)
+        stats.close()
+
+        # a crash left values that are not in the header in one column and
+        # a column with more values than the others
+        with open(os.path.join(path, 'turn.npy'), 'ab') as npy:
+            npy.write(bytes(8))
+        column = _NpyColumn(os.path.join(path, 'troops.npy'))
+        column.truncate(6)
+        column.close()
+
+        stats = TurnStats(path, capacity=2, use_parquet=False)
+        self.append_rows(stats, 1)
+        stats.close()
+
+        for name in COLUMNS:
+            with self.subTest(column=name):
+                length = read_npy_length(os.path.join(path, name + '.npy'))
+                self.assertEqual(length, 5)
+        self.assertEqual(read_column(path, 'turn'), [0, 1, 2, 3, 0])
+
+    @skipIf(np is None, 'NumPy is not installed.')
+    def test_npy_mmap(self):
+        path = os.path.join(self.directory, 'stats')
+        stats = TurnStats(path, capacity=4, use_parquet=False)
+        self.append_rows(stats, 6)
+        stats.close()
+
+        troops = np.load(os.path.join(path, 'troops.npy'), mmap_mode='r')
+        self.assertEqual(troops.dtype, np.int64)
+        self.assertEqual(troops.tolist(), [10 * i for i in range(6)])
+
+    @skipIf(pq is None, 'pyarrow is not installed.')
+    def test_parquet(self):
+        path = os.path.join(self.directory, 'stats')
+        stats = TurnStats(path, capacity=4)
+        self.append_rows(stats, 6)
+        stats.close()
+
+        table = pq.read_table(path)
+        self.assertEqual(table.column_names, list(COLUMNS))
+        self.assertEqual(table.column('turn').to_pylist(), list(range(6)))
+
+    @skipIf(pq is None, 'pyarrow is not installed.')
+    def test_parquet_reopen(self):
+        path = os.path.join(self.directory, 'stats')
+        for rows in [3, 2]:
+            stats = TurnStats(path, capacity=4)
+            self.append_rows(stats, rows)
+            stats.close()
+
+        # every run writes a file of its own
+        self.assertEqual(sorted(os.listdir(path)),
+                         ['part-00000.parquet', 'part-00001.parquet'])
+        table = pq.read_table(path)
+        self.assertEqual(table.column('turn').to_pylist(), [0, 1, 2, 0, 1])
+
+
+class TestLogicStats(TestCase):
+    """Test collecting statistics in the Logic."""
+
+    def test_record_turn(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'stats')
+
+        stats = TurnStats(path, use_parquet=False)
+        board = risk.board.Board()
+        logic = risk.logic.Logic(board, ['a', 'b'], 3, stats)
+        logic.start()
+
+        country = next(c for c in board.countries_list()
+                       if c.owner == logic.current_player)
+        logic.deploy(risk.messages.Deploy({'country': country.name,
+                                           'troops': 3}))
+        logic.next_turn(None)
+        stats.close()
+
+        # rows can be joined with the game's result
+        key = GameResult.from_logic(logic).game_key
+        self.assertEqual(read_column(path, 'game'), [key, key])
+        self.assertEqual(read_column(path, 'turn'), [1, 1])
+        self.assertEqual(read_column(path, 'player'), [0, 1])
+        self.assertEqual(read_column(path, 'territories'), [2, 2])
+        self.assertEqual(read_column(path, 'troops'), [5, 2])
+        self.assertEqual(read_column(path, 'attacks'), [0, 0])
+
+    def test_record_cards_traded(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'stats')
+
+        stats = TurnStats(path, use_parquet=False)
+        board = risk.board.Board()
+        logic = risk.logic.Logic(board, ['a', 'b'], 3, stats)
+        logic.start()
+
+        current = logic.current_player
+        current.cards = [risk.logic.Card.INFANTRY, risk.logic.Card.CAVALRY,
+                         risk.logic.Card.ARTILLERY]
+        logic.bonus(risk.messages.Bonus({'bonus': 'MIXED'}))
+
+        country = next(c for c in board.countries_list()
+                       if c.owner == current)
+        logic.deploy(risk.messages.Deploy({'country': country.name,
+                                           'troops': 3}))
+        logic.next_turn(None)
+        stats.close()
+
+        self.assertEqual(current.cards, [])
+        self.assertEqual(read_column(path, 'player'), [0, 1])
+        self.assertEqual(read_column(path, 'cards_traded'), [3, 0])